@@ -0,0 +1,65 @@
+"""
+Ответ /api/calendar за месяц: сырые события Google против компактной проекции
+(server/projection.py), без сжатия и со сжатием.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_calendar_payload [число событий]
+"""
+import sys
+import json
+import time
+import random
+from datetime import datetime, timedelta, timezone
+
+from server.compression import compress, brotli
+from server.projection import project_events, view_timezone
+
+
+def generate_items(count: int, seed: int = 42):
+    """События в том виде, в каком их хранит CalendarMirror (поля из SYNC_FIELDS)"""
+    rnd = random.Random(seed)
+    base = datetime(2025, 9, 1, tzinfo=timezone(timedelta(hours=3)))
+    items = []
+    for i in range(count):
+        start = base + timedelta(minutes=30 * rnd.randrange(2 * 24 * 30))
+        item = {
+            "id": f"{rnd.getrandbits(128):032x}",
+            "status": "confirmed",
+            "summary": rnd.choice(("Созвон с командой", "Встреча", "Обед", "Спортзал")),
+        }
+        if rnd.random() < 0.1:
+            item["start"] = {"date": start.date().isoformat()}
+            item["end"] = {"date": (start.date() + timedelta(days=1)).isoformat()}
+        else:
+            item["start"] = {"dateTime": start.isoformat(), "timeZone": "Europe/Moscow"}
+            item["end"] = {"dateTime": (start + timedelta(hours=1)).isoformat(), "timeZone": "Europe/Moscow"}
+        if rnd.random() < 0.3:
+            item["description"] = "Обсудить план на неделю и статус задач"
+        if rnd.random() < 0.2:
+            item["location"] = "Переговорная 3"
+        items.append(item)
+    items.sort(key=lambda item: item["start"].get("dateTime") or item["start"]["date"])
+    return items
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    items = generate_items(count)
+    tz = view_timezone("Europe/Moscow")
+
+    raw = json.dumps({"events": items}, ensure_ascii=False).encode("utf-8")
+    started = time.perf_counter()
+    compact = json.dumps(project_events(items, tz, with_days=True),
+                         ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    projection_ms = (time.perf_counter() - started) * 1000
+
+    print(f"событий: {count}, проекция: {projection_ms:.1f} мс")
+    print(f"{'':12}{'сырой':>10}{'компактный':>12}")
+    print(f"{'без сжатия':12}{len(raw):10d}{len(compact):12d}")
+    print(f"{'gzip':12}{len(compress(raw, 'gzip')):10d}{len(compress(compact, 'gzip')):12d}")
+    if brotli:
+        print(f"{'brotli':12}{len(compress(raw, 'br')):10d}{len(compress(compact, 'br')):12d}")
+
+
+if __name__ == '__main__':
+    main()
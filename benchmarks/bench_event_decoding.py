@@ -0,0 +1,96 @@
+"""
+Разбор событий в get_events: прежние словари с dateutil.parser.parse
+против EventRecord и parse_rfc3339 (bot/event_record.py).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_event_decoding [число событий]
+"""
+import sys
+import time
+import random
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytz
+
+from bot.event_record import EventRecord
+
+
+def generate_items(count: int, seed: int = 42):
+    """Строки summary/start/end, как их отдаёт локальная копия календаря"""
+    rnd = random.Random(seed)
+    tz = pytz.timezone('Europe/Moscow')
+    base = tz.localize(datetime(2025, 1, 1))
+    items = []
+    for _ in range(count):
+        start = base + timedelta(minutes=15 * rnd.randrange(4 * 24 * 365))
+        end = start + timedelta(minutes=rnd.choice((30, 60, 90)))
+        kind = rnd.random()
+        if kind < 0.1:
+            # событие на весь день
+            items.append({'summary': 'Отпуск', 'start': start.date().isoformat(),
+                          'end': (start.date() + timedelta(days=1)).isoformat()})
+        elif kind < 0.4:
+            utc = start.astimezone(pytz.utc).replace(tzinfo=None)
+            items.append({'summary': 'Созвон', 'start': utc.isoformat() + 'Z',
+                          'end': (utc + (end - start)).isoformat() + 'Z'})
+        else:
+            items.append({'summary': 'Встреча', 'start': start.isoformat(), 'end': end.isoformat()})
+    return items
+
+
+def legacy_decode(items):
+    """Прежний цикл get_events"""
+    events = []
+    for e in items:
+        start = e['start']
+        end = e['end']
+        from dateutil.parser import parse
+        start_dt = parse(start)
+        end_dt = parse(end) if end else None
+        events.append({
+            'title': e.get('summary') or 'Без названия',
+            'start': start_dt,
+            'end': end_dt
+        })
+    return events
+
+
+def record_decode(items):
+    return [EventRecord.from_strings(e['summary'], e['start'], e['end']) for e in items]
+
+
+def measure(func, items, repeat: int = 3):
+    """(лучшее время, пик памяти на результат)"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(items)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    result = func(items)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    items = generate_items(count)
+
+    # результаты совпадают
+    for old, new in zip(legacy_decode(items[:1000]), record_decode(items[:1000])):
+        assert (old['title'], old['start'], old['end']) == (new.title, new.start, new.end)
+
+    legacy_time, legacy_memory = measure(legacy_decode, items)
+    record_time, record_memory = measure(record_decode, items)
+
+    print(f"событий: {count}")
+    print(f"dateutil + dict:             {legacy_time * 1000:9.1f} мс, {legacy_memory / 2 ** 20:6.1f} МБ")
+    print(f"parse_rfc3339 + EventRecord: {record_time * 1000:9.1f} мс, {record_memory / 2 ** 20:6.1f} МБ")
+    print(f"ускорение:                   {legacy_time / record_time:9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Сравнение поиска свободного времени: прежний перебор часовых слотов
+против сортировки и одного прохода (bot/free_slots.py).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_free_slots [число событий] [дней]
+"""
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+import pytz
+
+from bot.event_record import EventRecord
+from bot.free_slots import events_to_busy, find_free_windows
+
+
+def legacy_free_slots(events, time_min, time_max):
+    """Прежняя реализация GoogleCalendarManager.get_free_slots (без запроса к API)"""
+    events = sorted(events, key=lambda e: e.start)
+    slots = []
+    current = time_min.replace(minute=0, second=0, microsecond=0)
+    while current < time_max:
+        slot_end = current + timedelta(hours=1)
+        is_free = True
+        for event in events:
+            event_start = event.start
+            event_end = event.end or (event_start + timedelta(hours=1))
+            if event_end > current and event_start < slot_end:
+                is_free = False
+                break
+        slots.append({'start': current, 'end': slot_end, 'free': is_free})
+        current = slot_end
+    return slots
+
+
+def generate_events(count: int, time_min: datetime, time_max: datetime, seed: int = 42):
+    rnd = random.Random(seed)
+    span = int((time_max - time_min).total_seconds() // 60)
+    events = []
+    for _ in range(count):
+        start = time_min + timedelta(minutes=rnd.randrange(span))
+        events.append(EventRecord('bench', start, start + timedelta(minutes=rnd.choice((15, 30, 60, 90)))))
+    events.sort(key=lambda e: e.start)
+    return events
+
+
+def measure(func, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 28
+    tz = pytz.timezone('Europe/Moscow')
+    time_min = tz.localize(datetime(2025, 9, 1))
+    time_max = time_min + timedelta(days=days)
+    events = generate_events(count, time_min, time_max)
+
+    legacy = measure(lambda: legacy_free_slots(events, time_min, time_max))
+    engine = measure(lambda: find_free_windows(
+        events_to_busy(events, tz), time_min, time_max, tz=tz,
+        min_duration=timedelta(minutes=30), granularity=timedelta(minutes=15)
+    ))
+
+    print(f"событий: {count}, период: {days} дн.")
+    print(f"прежний перебор слотов: {legacy * 1000:9.1f} мс")
+    print(f"sort-and-sweep:         {engine * 1000:9.1f} мс")
+    print(f"ускорение:              {legacy / engine:9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
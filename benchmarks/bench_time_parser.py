@@ -0,0 +1,75 @@
+"""
+Скорость разбора даты и времени: прежний parse_event_datetime
+(benchmarks/legacy_time_parser.py) против однопроходной грамматики bot/time_parser.py.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_time_parser [повторов корпуса]
+"""
+import sys
+import time
+
+from benchmarks import legacy_time_parser
+from bot import time_parser
+
+# реальные формулировки пользователей бота
+CORPUS = [
+    "завтра в 15 встреча",
+    "Встреча с Аней завтра в 14:30",
+    "послезавтра созвон в 10",
+    "сегодня в 18:30 спортзал",
+    "25.09 в 18:00 кино",
+    "25.12.2026 в 9 утра врач",
+    "в пятницу в 10 созвон",
+    "через 2 часа позвонить маме",
+    "через полчаса выйти",
+    "через 3 дня в 7 вечера ужин",
+    "с 10 до 12 лекция завтра",
+    "с 1 по 5 ноября отпуск",
+    "с понедельника по пятницу конференция",
+    "15 ноября день рождения Пети",
+    "в 15.30 стоматолог",
+    "встреча 17",
+    "обед в 13",
+    "завтра с 9:30 до 11 планёрка",
+    "командировка с 10.11 по 14.11",
+    "в среду в 3 дня встреча",
+    "купить молоко в субботу",
+    "дедлайн 1 декабря 2026",
+    "зал в 7 утра",
+    "сегодня отчёт",
+    "митинг в 20 часов",
+]
+TIMEZONE = 'Europe/Moscow'
+
+
+def run(parse, repeat: int):
+    """(сообщений в секунду, ошибок разбора)"""
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in CORPUS:
+            try:
+                parse(text, TIMEZONE)
+            except ValueError:
+                errors += 1
+    elapsed = time.perf_counter() - started
+    return repeat * len(CORPUS) / elapsed, errors // repeat
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    # прогрев: dateparser загружает языковые данные при первом вызове
+    run(legacy_time_parser.parse_event_datetime, 1)
+    run(time_parser.parse_event_datetime, 1)
+
+    legacy_rate, legacy_errors = run(legacy_time_parser.parse_event_datetime, repeat)
+    new_rate, new_errors = run(time_parser.parse_event_datetime, repeat)
+
+    print(f"фраз в корпусе: {len(CORPUS)}, повторов: {repeat}")
+    print(f"прежний парсер: {legacy_rate:10.0f} сообщ./с, не разобрано: {legacy_errors}")
+    print(f"грамматика:     {new_rate:10.0f} сообщ./с, не разобрано: {new_errors}")
+    print(f"ускорение:      {new_rate / legacy_rate:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
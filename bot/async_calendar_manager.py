@@ -0,0 +1,93 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bot.google_calendar_manager import GoogleCalendarManager
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncGoogleCalendarManager:
+    """
+    Асинхронная обёртка над GoogleCalendarManager.
+    Вызовы Google API выполняются в ограниченном пуле потоков,
+    поэтому медленный ответ Google не блокирует event loop бота.
+    """
+
+    def __init__(self, manager: GoogleCalendarManager = None,
+                 max_workers: int = None, timeout: float = None):
+        self.manager = manager or GoogleCalendarManager()
+        self.max_workers = max_workers or int(os.getenv('CALENDAR_MAX_WORKERS', '8'))
+        self.timeout = timeout or float(os.getenv('CALENDAR_TIMEOUT', '15'))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix='gcal'
+        )
+
+    async def _call(self, func, *args, default=None, **kwargs):
+        """Выполняет синхронный метод менеджера в пуле с таймаутом"""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Таймаут {self.timeout} с при вызове {func.__name__}")
+            return default
+
+    async def create_user_calendar(self, user_email: str, user_timezone: str,
+                                   calendar_summary: str = "Calendar_bot") -> str:
+        return await self._call(
+            self.manager.create_user_calendar, user_email, user_timezone, calendar_summary
+        )
+
+    async def provision_user_calendar(self, user_email: str, user_timezone: str,
+                                      calendar_summary: str = "Calendar_bot", first_event: dict = None):
+        return await self._call(
+            self.manager.provision_user_calendar, user_email, user_timezone, calendar_summary,
+            first_event=first_event, default=(None, None)
+        )
+
+    async def create_event(self, user_calendar_id: str, start: datetime, end: datetime = None,
+                           title: str = None, location: str = None, description: str = None,
+                           timezone: str = "Europe/Moscow") -> str:
+        return await self._call(
+            self.manager.create_event,
+            user_calendar_id=user_calendar_id, start=start, end=end, title=title,
+            location=location, description=description, timezone=timezone
+        )
+
+    async def create_events(self, user_calendar_id: str, events: list, timezone: str = "Europe/Moscow") -> list:
+        results = await self._call(
+            self.manager.create_events, user_calendar_id, events, timezone=timezone
+        )
+        if results is None:
+            # поток пула продолжает вставку; повтор безопасен — у событий стабильные id
+            return [{'link': None, 'error': 'timeout', 'existed': False} for _ in events]
+        return results
+
+    async def get_events(self, user_calendar_id: str, time_min: datetime, time_max: datetime, limit: int = None):
+        return await self._call(
+            self.manager.get_events, user_calendar_id, time_min, time_max, limit=limit, default=[]
+        )
+
+    async def get_busy_intervals(self, calendar_ids, time_min: datetime, time_max: datetime,
+                                 timezone: str = None):
+        return await self._call(
+            self.manager.get_busy_intervals, calendar_ids, time_min, time_max, timezone=timezone
+        )
+
+    async def get_free_slots(self, user_calendar_id: str, time_min: datetime, time_max: datetime, **kwargs):
+        return await self._call(
+            self.manager.get_free_slots, user_calendar_id, time_min, time_max, **kwargs
+        )
+
+    async def warm_up(self):
+        return await self._call(self.manager.warm_up, default=False)
+
+    async def prefetch_events(self, user_calendar_id: str):
+        return await self._call(self.manager.prefetch_events, user_calendar_id)
+
+    def close(self):
+        """Останавливает пул потоков"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from bot.db import connect
+from bot.sharding import shard_for
+
+logger = logging.getLogger(__name__)
+
+# ключи context.user_data, которые нужны после перезапуска; остальное не сохраняется
+CONVERSATION_KEYS = ('waiting_for', 'awaiting_clarify', 'pending_event', 'pending_events')
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    raise TypeError(f"{type(value).__name__} не сериализуется")
+
+
+def _decode(obj):
+    if '$dt' in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj['$dt'])
+    return obj
+
+
+def dump_state(user_data: dict):
+    """Компактный JSON состояния диалога или None, если сохранять нечего"""
+    state = {key: user_data[key] for key in CONVERSATION_KEYS if user_data.get(key) is not None}
+    if not state:
+        return None
+    return json.dumps(state, ensure_ascii=False, separators=(',', ':'), default=_encode)
+
+
+def load_state(blob: str) -> dict:
+    return json.loads(blob, object_hook=_decode)
+
+
+class ConversationPersistence(BasePersistence):
+    """
+    Состояние диалога (waiting_for, awaiting_clarify, pending_event(s)) в SQLite.
+
+    PTB раз в update_interval передаёт только изменившихся пользователей; неизменённое
+    с прошлой записи состояние пропускается, остальное пишется одной транзакцией в фоне.
+    Диалоги, брошенные дольше ttl секунд, не загружаются и удаляются (expired_users).
+    При шардировании процесс видит только пользователей своего шарда.
+    """
+
+    def __init__(self, db_file: str = None, ttl: float = None, update_interval: float = None,
+                 shard: int = 0, shards: int = 1):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval or float(os.getenv('CONVERSATION_FLUSH_INTERVAL', '5')),
+        )
+        self.db_file = db_file or os.getenv('CONVERSATIONS_DB', 'conversations.db')
+        self.ttl = ttl or float(os.getenv('CONVERSATION_TTL', str(6 * 3600)))
+        self.shard = shard
+        self.shards = shards
+        self._lock = threading.Lock()
+        self._conn = connect(self.db_file)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    user_id INTEGER PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+        # последняя записанная версия и время последней активности пользователя
+        self._written = {}
+        self._touched = {}
+        # user_id -> (state или None для удаления, время) — ждут записи и пишутся сейчас
+        self._pending = {}
+        self._inflight = {}
+        self._flush_task = None
+
+    def _own(self, user_id) -> bool:
+        return shard_for(user_id, self.shards) == self.shard
+
+    # ---------- user_data ----------
+    async def get_user_data(self):
+        expired_before = time.time() - self.ttl
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id, state, updated_at FROM conversations").fetchall()
+        user_data = {}
+        for row in rows:
+            if not self._own(row['user_id']) or row['updated_at'] < expired_before:
+                continue
+            try:
+                user_data[row['user_id']] = load_state(row['state'])
+            except ValueError:
+                logger.warning(f"Повреждённое состояние диалога пользователя {row['user_id']}, пропускаю")
+                continue
+            self._written[row['user_id']] = row['state']
+            self._touched[row['user_id']] = row['updated_at']
+        logger.info(f"Восстановлено диалогов: {len(user_data)}")
+        return user_data
+
+    def _latest(self, user_id):
+        """Последнее состояние пользователя: ждущее записи, записываемое или уже записанное"""
+        for source in (self._pending, self._inflight):
+            if user_id in source:
+                return source[user_id][0]
+        return self._written.get(user_id)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        now = time.time()
+        self._touched[user_id] = now
+        state = dump_state(data)
+        if state == self._latest(user_id):
+            return
+        self._pending[user_id] = (state, now)
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._touched.pop(user_id, None)
+        if self._latest(user_id) is not None:
+            self._pending[user_id] = (None, time.time())
+            self._schedule_flush()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    def expired_users(self):
+        """Пользователи без активности дольше ttl — их user_data можно выбросить из памяти"""
+        expired_before = time.time() - self.ttl
+        return [user_id for user_id, touched in self._touched.items() if touched < expired_before]
+
+    # ---------- запись ----------
+    def _schedule_flush(self):
+        # PTB вызывает update_user_data для всех изменившихся пользователей разом —
+        # задача запускается после них и пишет всё одной транзакцией
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_pending())
+
+    async def _flush_pending(self):
+        # изменения, пришедшие во время записи, попадают в _pending — пишем, пока он не опустеет
+        while self._pending:
+            batch, self._pending = self._pending, {}
+            self._inflight = batch
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception:
+                logger.exception("Не удалось сохранить состояние диалогов")
+                # возвращаем пачку до следующей записи; более свежие изменения тех же пользователей важнее
+                self._pending = {**batch, **self._pending}
+                return
+            finally:
+                self._inflight = {}
+            # записанной считаем версию только после успешной записи
+            for user_id, (state, _) in batch.items():
+                if state is None:
+                    self._written.pop(user_id, None)
+                else:
+                    self._written[user_id] = state
+
+    def _write(self, pending: dict):
+        upserts = [(user_id, state, at) for user_id, (state, at) in pending.items() if state is not None]
+        deletes = [(user_id,) for user_id, (state, _) in pending.items() if state is None]
+        with self._lock, self._conn:
+            if upserts:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO conversations (user_id, state, updated_at) VALUES (?, ?, ?)", upserts
+                )
+            if deletes:
+                self._conn.executemany("DELETE FROM conversations WHERE user_id = ?", deletes)
+
+    async def flush(self) -> None:
+        if self._flush_task:
+            await self._flush_task
+        await self._flush_pending()
+
+    # ---------- остальное не храним ----------
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str):
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        pass
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
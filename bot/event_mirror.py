@@ -0,0 +1,149 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+import pytz
+from googleapiclient.errors import HttpError
+
+from bot.db import connect
+from bot.event_pages import iter_event_pages, SYNC_FIELDS, SYNC_PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def _to_timestamp(value: dict, calendar_tz) -> float:
+    """Начало/конец события Google в timestamp; события на весь день — в таймзоне календаря"""
+    if value.get('dateTime'):
+        return datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00')).timestamp()
+    return calendar_tz.localize(datetime.fromisoformat(value['date'])).timestamp()
+
+
+class EventMirror:
+    """
+    Локальная копия событий календарей в SQLite.
+    Первый запрос делает полную синхронизацию, дальше — только изменения по syncToken.
+    """
+
+    def __init__(self, service_getter, db_file: str = None, min_sync_interval: float = None):
+        # клиент API берётся у менеджера при каждом вызове — он свой у каждого потока
+        self.service_getter = service_getter
+        self.db_file = db_file or os.getenv('EVENT_MIRROR_DB', 'events.db')
+        # чаще этого интервала изменения у Google не запрашиваем
+        self.min_sync_interval = min_sync_interval if min_sync_interval is not None else float(
+            os.getenv('EVENT_MIRROR_SYNC_INTERVAL', '30')
+        )
+        self._lock = threading.Lock()
+        self._calendar_locks = {}
+        self._conn = connect(self.db_file)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    calendar_id TEXT NOT NULL,
+                    event_id TEXT NOT NULL,
+                    start_ts REAL NOT NULL,
+                    end_ts REAL NOT NULL,
+                    start TEXT NOT NULL,
+                    end TEXT NOT NULL,
+                    summary TEXT,
+                    PRIMARY KEY (calendar_id, event_id)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS events_range ON events (calendar_id, start_ts)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    calendar_id TEXT PRIMARY KEY,
+                    sync_token TEXT,
+                    timezone TEXT,
+                    synced_at REAL NOT NULL DEFAULT 0
+                )
+            """)
+
+    def _calendar_lock(self, calendar_id: str) -> threading.Lock:
+        with self._lock:
+            return self._calendar_locks.setdefault(calendar_id, threading.Lock())
+
+    def _state(self, calendar_id: str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT sync_token, timezone, synced_at FROM sync_state WHERE calendar_id = ?", (calendar_id,)
+            ).fetchone()
+
+    def invalidate(self, calendar_id: str):
+        """Следующий запрос к календарю обязательно сходит за изменениями"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE sync_state SET synced_at = 0 WHERE calendar_id = ?", (calendar_id,))
+
+    def _fetch(self, calendar_id: str, sync_token: str = None):
+        """Все страницы изменений: (события, новый syncToken, таймзона календаря)"""
+        items = []
+        params = {'syncToken': sync_token} if sync_token else {}
+        pages = iter_event_pages(
+            self.service_getter(), calendar_id, fields=SYNC_FIELDS, page_size=SYNC_PAGE_SIZE, **params
+        )
+        for page in pages:
+            items.extend(page.get('items', []))
+        return items, page.get('nextSyncToken'), page.get('timeZone', 'UTC')
+
+    def _apply(self, calendar_id: str, items, sync_token: str, timezone: str, full: bool):
+        calendar_tz = pytz.timezone(timezone)
+        upserts, deletes = [], []
+        for item in items:
+            if item.get('status') == 'cancelled':
+                deletes.append((calendar_id, item['id']))
+                continue
+            start = item['start'].get('dateTime') or item['start'].get('date')
+            end = item['end'].get('dateTime') or item['end'].get('date')
+            upserts.append((
+                calendar_id, item['id'],
+                _to_timestamp(item['start'], calendar_tz), _to_timestamp(item['end'], calendar_tz),
+                start, end, item.get('summary'),
+            ))
+
+        with self._lock, self._conn:
+            if full:
+                self._conn.execute("DELETE FROM events WHERE calendar_id = ?", (calendar_id,))
+            self._conn.executemany("DELETE FROM events WHERE calendar_id = ? AND event_id = ?", deletes)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO events (calendar_id, event_id, start_ts, end_ts, start, end, summary) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                upserts
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (calendar_id, sync_token, timezone, synced_at) VALUES (?, ?, ?, ?)",
+                (calendar_id, sync_token, timezone, time.time())
+            )
+
+    def sync(self, calendar_id: str, force: bool = False):
+        """Подтягивает изменения календаря (полная синхронизация, если токена ещё нет или он истёк)"""
+        with self._calendar_lock(calendar_id):
+            state = self._state(calendar_id)
+            if state and not force and time.time() - state['synced_at'] < self.min_sync_interval:
+                return
+            sync_token = state['sync_token'] if state else None
+
+            if sync_token:
+                try:
+                    items, next_token, timezone = self._fetch(calendar_id, sync_token)
+                    self._apply(calendar_id, items, next_token, timezone, full=False)
+                    logger.info(f"Инкрементальная синхронизация {calendar_id}: изменений {len(items)}")
+                    return
+                except HttpError as e:
+                    if e.resp.status != 410:
+                        raise
+                    logger.info(f"syncToken календаря {calendar_id} истёк, полная синхронизация")
+
+            items, next_token, timezone = self._fetch(calendar_id)
+            self._apply(calendar_id, items, next_token, timezone, full=True)
+            logger.info(f"Полная синхронизация {calendar_id}: событий {len(items)}")
+
+    def query(self, calendar_id: str, time_min: datetime, time_max: datetime, limit: int = None):
+        """События, пересекающиеся с [time_min, time_max), по возрастанию начала (не больше limit)"""
+        self.sync(calendar_id)
+        with self._lock:
+            return self._conn.execute(
+                "SELECT event_id, summary, start, end FROM events "
+                "WHERE calendar_id = ? AND start_ts < ? AND end_ts > ? ORDER BY start_ts LIMIT ?",
+                (calendar_id, time_max.timestamp(), time_min.timestamp(), -1 if limit is None else limit)
+            ).fetchall()
@@ -0,0 +1,49 @@
+import os
+from datetime import datetime
+from itertools import islice
+
+# только поля, которые использует бот: меньше ответ и быстрее разбор JSON
+EVENT_ITEM_FIELDS = 'items(id,status,summary,start,end)'
+LIST_FIELDS = f'nextPageToken,{EVENT_ITEM_FIELDS}'
+SYNC_FIELDS = f'nextPageToken,nextSyncToken,timeZone,{EVENT_ITEM_FIELDS}'
+
+# максимум events.list за страницу; полная синхронизация берёт страницы покрупнее
+DEFAULT_PAGE_SIZE = int(os.getenv('CALENDAR_PAGE_SIZE', '250'))
+SYNC_PAGE_SIZE = 2500
+
+
+def iter_event_pages(service, calendar_id: str, fields: str = LIST_FIELDS, page_size: int = None, **params):
+    """
+    Страницы events.list по nextPageToken — следующая запрашивается, только когда нужна.
+    Последняя страница несёт nextSyncToken (если просили синхронизацию).
+    """
+    request_params = {
+        'calendarId': calendar_id,
+        'singleEvents': True,
+        'maxResults': page_size or DEFAULT_PAGE_SIZE,
+        'fields': fields,
+        **params,
+    }
+    while True:
+        page = service.events().list(**request_params).execute()
+        yield page
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return
+        request_params['pageToken'] = page_token
+
+
+def iter_events(service, calendar_id: str, time_min: datetime, time_max: datetime,
+                limit: int = None, page_size: int = None):
+    """
+    События периода по возрастанию начала, по одному.
+    При limit страниц запрашивается ровно столько, сколько нужно для limit событий.
+    """
+    if limit is not None and page_size is None:
+        page_size = min(limit, DEFAULT_PAGE_SIZE)
+    pages = iter_event_pages(
+        service, calendar_id, page_size=page_size,
+        timeMin=time_min.isoformat(), timeMax=time_max.isoformat(), orderBy='startTime'
+    )
+    events = (item for page in pages for item in page.get('items', []))
+    return islice(events, limit) if limit is not None else events
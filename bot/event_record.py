@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+
+_UTC = timezone.utc
+
+
+def parse_rfc3339(value: str) -> datetime:
+    """
+    Дата/время из Google Calendar (RFC3339).
+    '2025-09-01T10:00:00+03:00' и '...Z' — datetime с таймзоной;
+    '2025-09-01' (событие на весь день) — наивная полночь, как и раньше у dateutil.
+    """
+    if len(value) == 10:
+        return datetime(int(value[:4]), int(value[5:7]), int(value[8:10]))
+    if value[-1] == 'Z':
+        return datetime.fromisoformat(value[:-1]).replace(tzinfo=_UTC)
+    return datetime.fromisoformat(value)
+
+
+class EventRecord:
+    """Событие календаря для ответов бота: название и границы уже разобраны"""
+
+    __slots__ = ('title', 'start', 'end')
+
+    def __init__(self, title: str, start: datetime, end: datetime = None):
+        self.title = title
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def from_strings(cls, summary, start: str, end: str = None) -> 'EventRecord':
+        return cls(
+            summary or 'Без названия',
+            parse_rfc3339(start),
+            parse_rfc3339(end) if end else None,
+        )
+
+    def __repr__(self):
+        return f"EventRecord({self.title!r}, {self.start!r}, {self.end!r})"
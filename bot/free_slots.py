@@ -0,0 +1,107 @@
+import heapq
+from datetime import datetime, timedelta, time
+
+import pytz
+
+
+def parse_working_hours(value: str):
+    """'09:00-18:00' -> (time(9, 0), time(18, 0)); пустая строка — без ограничений"""
+    if not value:
+        return None
+    start, end = value.split('-')
+    return time.fromisoformat(start.strip()), time.fromisoformat(end.strip())
+
+
+def events_to_busy(events, tz, default_duration: timedelta = timedelta(hours=1), include_all_day: bool = True):
+    """
+    Интервалы занятости из событий get_events (EventRecord).
+    События на весь день приходят без таймзоны — они занимают целые дни в таймзоне пользователя.
+    """
+    busy = []
+    for event in events:
+        start = event.start
+        end = event.end or start + default_duration
+        if start.tzinfo is None:
+            if not include_all_day:
+                continue
+            start = tz.localize(start)
+            end = tz.localize(end) if end.tzinfo is None else end
+        busy.append((start, end))
+    return busy
+
+
+def merge_intervals(intervals):
+    """Сортирует и склеивает пересекающиеся и смежные интервалы"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _off_hours(time_min: datetime, time_max: datetime, working_hours, tz):
+    """Нерабочее время каждого дня периода как интервалы занятости (уже отсортированы)"""
+    work_start, work_end = working_hours
+    day = time_min.astimezone(tz).date() - timedelta(days=1)
+    last_day = time_max.astimezone(tz).date()
+    while day <= last_day:
+        midnight = tz.localize(datetime.combine(day, time.min))
+        next_midnight = tz.localize(datetime.combine(day + timedelta(days=1), time.min))
+        yield midnight, tz.localize(datetime.combine(day, work_start))
+        yield tz.localize(datetime.combine(day, work_end)), next_midnight
+        day += timedelta(days=1)
+
+
+def _ceil_to(dt: datetime, granularity: timedelta, tz) -> datetime:
+    """Округляет вверх до сетки с шагом granularity от полуночи"""
+    local = dt.astimezone(tz)
+    midnight = tz.localize(datetime.combine(local.date(), time.min))
+    steps = -((midnight - local) // granularity)
+    return tz.normalize(midnight + steps * granularity)
+
+
+def _floor_to(dt: datetime, granularity: timedelta, tz) -> datetime:
+    local = dt.astimezone(tz)
+    midnight = tz.localize(datetime.combine(local.date(), time.min))
+    steps = (local - midnight) // granularity
+    return tz.normalize(midnight + steps * granularity)
+
+
+def find_free_windows(busy, time_min: datetime, time_max: datetime, tz=pytz.utc,
+                      min_duration: timedelta = timedelta(0), granularity: timedelta = None,
+                      working_hours=None):
+    """
+    Максимальные свободные окна в [time_min, time_max) — одна сортировка и один проход.
+    :param busy: интервалы занятости (start, end)
+    :param min_duration: окна короче не возвращаются
+    :param granularity: границы окон выравниваются по сетке (например, 15 минут)
+    :param working_hours: (time, time) — свободным считается только рабочее время
+    :return: (свободные окна, склеенные интервалы занятости)
+    """
+    merged = merge_intervals((max(s, time_min), min(e, time_max)) for s, e in busy if e > time_min and s < time_max)
+    blocked = merged
+    if working_hours:
+        blocked = merge_intervals(heapq.merge(merged, _off_hours(time_min, time_max, working_hours, tz)))
+
+    free = []
+    cursor = time_min
+    for start, end in blocked:
+        if start >= time_max:
+            break
+        if start > cursor:
+            free.append((cursor, start))
+        if end > cursor:
+            cursor = end
+    if cursor < time_max:
+        free.append((cursor, time_max))
+
+    windows = []
+    for start, end in free:
+        if granularity:
+            start, end = _ceil_to(start, granularity, tz), _floor_to(end, granularity, tz)
+        if end - start >= min_duration and end > start:
+            windows.append((start, end))
+    return windows, merged
@@ -1,19 +1,49 @@
 import os
+import hashlib
 import logging
+import threading
 from datetime import datetime, timedelta
 from typing import Optional
 
+import pytz
+import httplib2
+import google_auth_httplib2
+import google.auth.transport.requests
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from bot.event_mirror import EventMirror
+from bot.event_pages import iter_events
+from bot.event_record import EventRecord
+from bot.free_slots import find_free_windows, parse_working_hours
+
 logger = logging.getLogger(__name__)
 
 
 class GoogleCalendarManager:
-    def __init__(self):
-        self.service = None
+    def __init__(self, http_timeout: float = None):
+        self.credentials = None
+        self.http_timeout = http_timeout or float(os.getenv('CALENDAR_HTTP_TIMEOUT', '10'))
+        # сколько событий отправлять в одном batch-запросе (Google рекомендует не больше 50)
+        self.batch_size = int(os.getenv('CALENDAR_BATCH_SIZE', '50'))
+        # httplib2 не потокобезопасен — у каждого потока свой клиент API
+        self._local = threading.local()
         self._setup_service_account()
+        # локальная копия событий с инкрементальной синхронизацией (EVENT_MIRROR=0 — отключить)
+        self.mirror = EventMirror(lambda: self.service) if os.getenv('EVENT_MIRROR', '1') == '1' else None
+
+    @property
+    def service(self):
+        """Клиент Calendar API для текущего потока"""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            http = google_auth_httplib2.AuthorizedHttp(
+                self.credentials, http=httplib2.Http(timeout=self.http_timeout)
+            )
+            service = build('calendar', 'v3', http=http, cache_discovery=False)
+            self._local.service = service
+        return service
 
     def _setup_service_account(self):
         """Настройка Service Account для доступа к календарю"""
@@ -23,20 +53,48 @@ class GoogleCalendarManager:
                 raise FileNotFoundError(f"Файл {service_account_file} не найден")
 
             scopes = ['https://www.googleapis.com/auth/calendar']
-            credentials = service_account.Credentials.from_service_account_file(
+            self.credentials = service_account.Credentials.from_service_account_file(
                 service_account_file, scopes=scopes
             )
-            self.service = build('calendar', 'v3', credentials=credentials)
+            # проверяем, что клиент собирается
+            self.service
             logger.info("Service Account успешно настроен")
         except Exception as e:
             logger.error(f"Ошибка настройки Service Account: {e}")
             raise
 
+    def warm_up(self):
+        """Готовит клиент текущего потока и обновляет токен сервисного аккаунта заранее"""
+        service = self.service
+        if not self.credentials.valid:
+            self.credentials.refresh(google.auth.transport.requests.Request())
+        return service is not None
+
+    def prefetch_events(self, user_calendar_id: str):
+        """Синхронизирует локальную копию календаря, чтобы следующий get_events не ждал Google"""
+        if not user_calendar_id:
+            return
+        if self.mirror:
+            self.mirror.sync(user_calendar_id)
+        else:
+            self.warm_up()
+
     def create_user_calendar(self, user_email: str,  user_timezone: str,
                              calendar_summary: str = "Calendar_bot") -> str:
         """Создаём отдельный календарь для пользователя и даём права на запись"""
+        calendar_id, _ = self.provision_user_calendar(user_email, user_timezone, calendar_summary)
+        return calendar_id
+
+    def provision_user_calendar(self, user_email: str, user_timezone: str,
+                                calendar_summary: str = "Calendar_bot", first_event: dict = None):
+        """
+        Создаёт календарь пользователя за два запроса: calendars.insert,
+        затем одним batch-запросом права на запись и (если передано) первое событие.
+        :param first_event: аргументы create_event без user_calendar_id
+        :return: (calendar_id, ссылка на первое событие)
+        """
         try:
-            # Создаём календарь
+            # Создаём календарь — его id нужен всем остальным запросам
             calendar = {
                 'summary': calendar_summary,
                 'timeZone':  user_timezone
@@ -44,23 +102,104 @@ class GoogleCalendarManager:
             created_calendar = self.service.calendars().insert(body=calendar).execute()
             calendar_id = created_calendar['id']
 
+            results = {}
+
+            def on_response(request_id, response, exception):
+                results[request_id] = (response, exception)
+
+            batch = self.service.new_batch_http_request(callback=on_response)
             # Даем пользователю права на запись
             acl_rule = {
                 'role': 'writer',  # можно writer/editor
                 'scope': {'type': 'user', 'value': user_email}
             }
-            self.service.acl().insert(calendarId=calendar_id, body=acl_rule).execute()
+            batch.add(self.service.acl().insert(calendarId=calendar_id, body=acl_rule), request_id='acl')
+            if first_event:
+                batch.add(
+                    self.service.events().insert(calendarId=calendar_id, body=self._event_body(**first_event)),
+                    request_id='event'
+                )
+            batch.execute()
+
+            _, acl_error = results['acl']
+            if acl_error:
+                raise acl_error
             logger.info(f"Календарь создан для {user_email}, "
                         f"calendarId={calendar_id}, "
                         f"timezone={user_timezone}")
 
-            return calendar_id
+            event_link = None
+            if first_event:
+                event, event_error = results['event']
+                if event_error:
+                    logger.error(f"Ошибка при создании события: {event_error}")
+                else:
+                    event_link = event.get('htmlLink')
+                    logger.info(f"Событие '{first_event.get('title')}' создано в календаре {calendar_id}")
+
+            return calendar_id, event_link
         except HttpError as error:
             logger.error(f"HTTP ошибка при создании календаря: {error}")
-            return None
+            return None, None
         except Exception as e:
             logger.error(f"Ошибка при создании календаря: {e}")
-            return None
+            return None, None
+
+    @staticmethod
+    def _event_body(
+            start: datetime,
+            end: datetime = None,
+            title: str = None,
+            location: str = None,
+            description: str = None,
+            timezone: str = "Europe/Moscow"
+    ) -> dict:
+        """Тело события для events.insert"""
+        # если конец не указан — +1 час
+        if end is None:
+            end = start + timedelta(hours=1)
+
+        return {
+            'summary': title if title else "Без названия",
+            'location': location if location else None,
+            'description': description if description else None,
+            'start': {
+                'dateTime': start.isoformat(),
+                'timeZone': timezone
+            },
+            'end': {
+                'dateTime': end.isoformat(),
+                'timeZone': timezone
+            },
+            'reminders': {
+                'useDefault': False,
+                'overrides': [
+                    {'method': 'email', 'minutes': 10},
+                    {'method': 'popup', 'minutes': 10},
+                ],
+            }
+        }
+
+    @staticmethod
+    def _event_id(user_calendar_id: str, body: dict) -> str:
+        """
+        Стабильный id события: повторная вставка того же события (повтор после таймаута)
+        получает 409 от Google вместо дубликата. hex — подмножество base32hex, которого требует API.
+        """
+        key = "|".join((
+            user_calendar_id, body['summary'], body['start']['dateTime'], body['end']['dateTime'],
+            body.get('location') or "", body.get('description') or "",
+        ))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _restore_event(self, user_calendar_id: str, body: dict):
+        """
+        Запрос на случай 409: событие с таким id уже есть. update идемпотентен,
+        возвращает htmlLink и восстанавливает событие, если его успели удалить.
+        """
+        return self.service.events().update(
+            calendarId=user_calendar_id, eventId=body['id'], body={**body, 'status': 'confirmed'}
+        )
 
     def create_event(
             self,
@@ -74,35 +213,22 @@ class GoogleCalendarManager:
     ) -> str:
         """Создание события в календаре пользователя"""
         try:
-            # если конец не указан — +1 час
-            if end is None:
-                end = start + timedelta(hours=1)
-
-            event = {
-                'summary': title if title else "Без названия",
-                'location': location if location else None,
-                'description': description if description else None,
-                'start': {
-                    'dateTime': start.isoformat(),
-                    'timeZone': timezone
-                },
-                'end': {
-                    'dateTime': end.isoformat(),
-                    'timeZone': timezone
-                },
-                'reminders': {
-                    'useDefault': False,
-                    'overrides': [
-                        {'method': 'email', 'minutes': 10},
-                        {'method': 'popup', 'minutes': 10},
-                    ],
-                }
-            }
+            event = self._event_body(start, end, title, location, description, timezone)
+            event['id'] = self._event_id(user_calendar_id, event)
+
+            try:
+                created_event = self.service.events().insert(
+                    calendarId=user_calendar_id,
+                    body=event
+                ).execute()
+            except HttpError as error:
+                if error.resp.status != 409:
+                    raise
+                # событие уже создано прошлой попыткой (например, после таймаута)
+                created_event = self._restore_event(user_calendar_id, event).execute()
 
-            created_event = self.service.events().insert(
-                calendarId=user_calendar_id,
-                body=event
-            ).execute()
+            if self.mirror:
+                self.mirror.invalidate(user_calendar_id)
 
             event_link = created_event.get('htmlLink')
             logger.info(f"Событие '{title}' создано в календаре {user_calendar_id}")
@@ -112,84 +238,169 @@ class GoogleCalendarManager:
             logger.error(f"Ошибка при создании события: {e}")
             return None
 
+    def create_events(self, user_calendar_id: str, events: list, timezone: str = "Europe/Moscow") -> list:
+        """
+        Создание нескольких событий batch-запросами: до batch_size событий за один HTTP-запрос.
+        :param events: словари с ключами title, start, end, location, description
+        У событий стабильные id, поэтому повтор после таймаута не создаёт дубликаты.
+        :return: [{'link': ссылка или None, 'error': текст ошибки или None,
+                   'existed': событие уже было в календаре}] в порядке events
+        """
+        results = [{'link': None, 'error': None, 'existed': False} for _ in events]
+        bodies = []
+        for event in events:
+            body = self._event_body(
+                event['start'], event.get('end'), event.get('title'),
+                event.get('location'), event.get('description'), timezone
+            )
+            body['id'] = self._event_id(user_calendar_id, body)
+            bodies.append(body)
+        # события, уже созданные прошлой попыткой (409) — дочитываем их отдельным batch
+        existing = []
+
+        def on_response(request_id, response, exception):
+            i = int(request_id)
+            item = results[i]
+            if exception is None:
+                item['link'] = response.get('htmlLink')
+            elif isinstance(exception, HttpError) and exception.resp.status == 409 and i not in existing:
+                existing.append(i)
+            else:
+                item['error'] = str(exception)
+
+        def run_batches(indexes, make_request):
+            for chunk_start in range(0, len(indexes), self.batch_size):
+                chunk = indexes[chunk_start:chunk_start + self.batch_size]
+                try:
+                    batch = self.service.new_batch_http_request(callback=on_response)
+                    for i in chunk:
+                        batch.add(make_request(bodies[i]), request_id=str(i))
+                    batch.execute()
+                except Exception as e:
+                    # весь batch не дошёл до Google — ошибка у каждого события пачки
+                    logger.error(f"Ошибка batch-запроса создания событий: {e}")
+                    for i in chunk:
+                        if results[i]['link'] is None and results[i]['error'] is None:
+                            results[i]['error'] = str(e)
+
+        run_batches(list(range(len(events))),
+                    lambda body: self.service.events().insert(calendarId=user_calendar_id, body=body))
+        if existing:
+            logger.info(f"{len(existing)} событий уже были созданы ранее в календаре {user_calendar_id}")
+            run_batches(list(existing), lambda body: self._restore_event(user_calendar_id, body))
+            for i in existing:
+                results[i]['existed'] = results[i]['link'] is not None
+
+        if self.mirror:
+            self.mirror.invalidate(user_calendar_id)
 
-    def get_events(self, user_calendar_id: str, time_min: datetime, time_max: datetime):
+        failed = sum(1 for item in results if item['error'])
+        existed = sum(1 for item in results if item['existed'])
+        logger.info(f"Создано {len(events) - failed - existed} из {len(events)} событий "
+                    f"(уже были: {existed}) в календаре {user_calendar_id}")
+        return results
+
+
+    def get_events(self, user_calendar_id: str, time_min: datetime, time_max: datetime, limit: int = None):
         """
         Возвращает список событий из календаря за указанный период
         :param user_calendar_id: id календаря пользователя
         :param time_min: datetime начала диапазона
         :param time_max: datetime конца диапазона
-        :return: список словарей с ключами 'title', 'start', 'end'
+        :param limit: сколько первых событий нужно (остальные страницы не запрашиваются)
+        :return: список EventRecord (title, start, end)
         """
         if not user_calendar_id:
             return []
 
-        # Приведение к формату ISO
-        time_min_iso = time_min.isoformat()
-        time_max_iso = time_max.isoformat()
-
         try:
-            events_result = self.service.events().list(
-                calendarId=user_calendar_id,
-                timeMin=time_min_iso,
-                timeMax=time_max_iso,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-
-            events = []
-            for e in events_result.get('items', []):
-                start = e['start'].get('dateTime') or e['start'].get('date')
-                end = e['end'].get('dateTime') or e['end'].get('date')
-
-                # Конвертация строк в datetime с учетом часового пояса
-                from dateutil.parser import parse
-                start_dt = parse(start)
-                end_dt = parse(end) if end else None
-
-                events.append({
-                    'title': e.get('summary', 'Без названия'),
-                    'start': start_dt,
-                    'end': end_dt
-                })
-
-            return events
+            if self.mirror:
+                return [
+                    EventRecord.from_strings(row['summary'], row['start'], row['end'])
+                    for row in self.mirror.query(user_calendar_id, time_min, time_max, limit=limit)
+                ]
+            # постранично, только summary/start/end
+            return [
+                EventRecord.from_strings(
+                    e.get('summary'),
+                    e['start'].get('dateTime') or e['start'].get('date'),
+                    e['end'].get('dateTime') or e['end'].get('date'),
+                )
+                for e in iter_events(self.service, user_calendar_id, time_min, time_max, limit=limit)
+            ]
 
         except Exception as ex:
             logging.getLogger(__name__).error(f"Ошибка при получении событий: {ex}")
             return []
 
+    def get_busy_intervals(self, calendar_ids, time_min: datetime, time_max: datetime, timezone: str = None):
+        """
+        Занятые интервалы одного или нескольких календарей одним запросом FreeBusy.
+        :return: {calendar_id: [(start, end), ...]} или None при ошибке
+        """
+        body = {
+            'timeMin': time_min.isoformat(),
+            'timeMax': time_max.isoformat(),
+            'items': [{'id': calendar_id} for calendar_id in calendar_ids],
+        }
+        if timezone:
+            body['timeZone'] = timezone
+
+        try:
+            result = self.service.freebusy().query(body=body).execute()
+        except Exception as ex:
+            logger.error(f"Ошибка FreeBusy: {ex}")
+            return None
+
+        busy = {}
+        for calendar_id, calendar in result.get('calendars', {}).items():
+            if calendar.get('errors'):
+                logger.error(f"FreeBusy для {calendar_id}: {calendar['errors']}")
+                return None
+            busy[calendar_id] = [
+                (datetime.fromisoformat(b['start']), datetime.fromisoformat(b['end']))
+                for b in calendar.get('busy', [])
+            ]
+        return busy
+
     def get_free_slots(
-            self, user_calendar_id: str, time_min: datetime, time_max: datetime
+            self, user_calendar_id: str, time_min: datetime, time_max: datetime,
+            timezone: str = None, min_duration: timedelta = None,
+            granularity: timedelta = None, working_hours=None, extra_calendar_ids=()
     ):
         """
-        Возвращает список слотов по 1 часу с отметкой свободен/занят.
-        :return: [{'start': datetime, 'end': datetime, 'free': True/False}]
+        Возвращает свободные окна и занятые интервалы периода по возрастанию времени.
+        Занятость берётся из FreeBusy — без загрузки самих событий.
+        :param extra_calendar_ids: другие календари, занятость в которых тоже учитывается
+        :param timezone: таймзона пользователя (для событий на весь день и рабочих часов)
+        :param min_duration: минимальная длина свободного окна (FREE_SLOT_MIN_MINUTES)
+        :param granularity: шаг выравнивания границ окон (FREE_SLOT_GRANULARITY_MINUTES)
+        :param working_hours: (time, time) — рабочие часы (WORKING_HOURS, например 09:00-18:00)
+        :return: [{'start': datetime, 'end': datetime, 'free': True/False}] или None при ошибке FreeBusy
         """
-        events = self.get_events(user_calendar_id, time_min, time_max)
-        events = sorted(events, key=lambda e: e['start'])
-        slots = []
-
-        current = time_min.replace(minute=0, second=0, microsecond=0)
-
-        while current < time_max:
-            slot_end = current + timedelta(hours=1)
-            # проверяем, пересекается ли слот с каким-либо событием
-            is_free = True
-            for event in events:
-                event_start = event['start']
-                event_end = event['end'] or (event_start + timedelta(hours=1))
-                if event_end > current and event_start < slot_end:
-                    is_free = False
-                    break
-
-            slots.append({
-                'start': current,
-                'end': slot_end,
-                'free': is_free
-            })
-
-            current = slot_end
+        tz = pytz.timezone(timezone or 'UTC')
+        if min_duration is None:
+            min_duration = timedelta(minutes=int(os.getenv('FREE_SLOT_MIN_MINUTES', '30')))
+        if granularity is None:
+            granularity = timedelta(minutes=int(os.getenv('FREE_SLOT_GRANULARITY_MINUTES', '15')))
+        if working_hours is None:
+            working_hours = parse_working_hours(os.getenv('WORKING_HOURS', ''))
 
-        return slots
+        calendar_ids = [cid for cid in (user_calendar_id, *extra_calendar_ids) if cid]
+        if not calendar_ids:
+            return []
+        busy_by_calendar = self.get_busy_intervals(calendar_ids, time_min, time_max, timezone=tz.zone)
+        if busy_by_calendar is None:
+            # занятость неизвестна — «свободно весь день» было бы неправдой
+            return None
+
+        free, busy = find_free_windows(
+            [interval for intervals in busy_by_calendar.values() for interval in intervals],
+            time_min, time_max, tz=tz,
+            min_duration=min_duration, granularity=granularity, working_hours=working_hours
+        )
 
+        slots = [{'start': start, 'end': end, 'free': True} for start, end in free]
+        slots += [{'start': start, 'end': end, 'free': False} for start, end in busy]
+        slots.sort(key=lambda slot: slot['start'])
+        return slots
@@ -0,0 +1,281 @@
+import os
+import re
+import json
+import asyncio
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, date, timedelta
+
+import pytz
+
+from bot.db import connect
+
+logger = logging.getLogger(__name__)
+
+MONTHS = {
+    'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5,
+    'июня': 6, 'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10,
+    'ноября': 11, 'декабря': 12
+}
+ABSOLUTE_DATE = re.compile(
+    r'\b(\d{1,2})(?:[./](\d{1,2})|\s+(' + '|'.join(MONTHS) + r'))(?:[./\s](\d{4}))?\b'
+)
+# «в 9.05», «к 10.30», «с 9.30», «до 12.00», «9.00-10.30» — время, а не дата
+TIME_CONTEXT = re.compile(r'(?:(?<!\w)(?:в|к|с|до|от)\s*|\d\s*-\s*)$')
+TIME_RANGE_NEXT = re.compile(r'\s*-\s*\d')
+DOTTED_TIME = re.compile(r'(?:[01]?\d|2[0-3])\.[0-5]\d')
+# ответ зависит от текущего времени с точностью до минут — такие запросы не кэшируем
+NOW_RELATIVE = re.compile(r'через|сейчас|полчаса')
+PUNCTUATION = re.compile(r'[^\w\s<>:]')
+SPACES = re.compile(r'\s+')
+DATETIME_FIELDS = ('start', 'end', 'time_min', 'time_max')
+
+
+def normalize(text: str):
+    """
+    Приводит текст к ключу кэша: нижний регистр, без пунктуации,
+    абсолютные даты заменены на <date>. Возвращает (шаблон, даты).
+    Время через точку после предлога или в диапазоне часов остаётся в шаблоне как есть.
+
+    >>> normalize('Встреча 25.09!')
+    ('встреча <date>', [(25, 9, None)])
+    >>> normalize('встреча в 9.05')
+    ('встреча в 9 05', [])
+    >>> normalize('встреча 9.05 с 9.30 до 10.30')
+    ('встреча <date> с 9 30 до 10 30', [(9, 5, None)])
+    >>> normalize('созвон 9.00-10.30')
+    ('созвон 9 00 10 30', [])
+    """
+    text = text.lower().replace('ё', 'е')
+    dates = []
+
+    def _replace(match):
+        if (match.group(2) and not match.group(4) and DOTTED_TIME.fullmatch(match.group(0))
+                and (TIME_CONTEXT.search(text, 0, match.start()) or TIME_RANGE_NEXT.match(text, match.end()))):
+            return match.group(0)
+        day = int(match.group(1))
+        month = int(match.group(2)) if match.group(2) else MONTHS[match.group(3)]
+        year = int(match.group(4)) if match.group(4) else None
+        dates.append((day, month, year))
+        return ' <date> '
+
+    text = ABSOLUTE_DATE.sub(_replace, text)
+    text = PUNCTUATION.sub(' ', text)
+    text = SPACES.sub(' ', text).strip()
+    return text, dates
+
+
+def _resolve_dates(dates, today: date):
+    """Даты без года — ближайшие будущие (как в правилах промпта)"""
+    resolved = []
+    for day, month, year in dates:
+        try:
+            d = date(year or today.year, month, day)
+            if year is None and d < today:
+                d = d.replace(year=today.year + 1)
+        except ValueError:
+            return None
+        resolved.append(d)
+    return resolved
+
+
+def _shift_result(result: dict, delta: timedelta, user_tz) -> dict:
+    """Сдвигает все временные поля результата на delta дней в таймзоне пользователя"""
+    shifted = dict(result)
+    for field in DATETIME_FIELDS:
+        value = shifted.get(field)
+        if not value:
+            continue
+        try:
+            dt = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        naive = dt.replace(tzinfo=None) + delta
+        shifted[field] = (user_tz.localize(naive) if dt.tzinfo else naive).isoformat()
+    if shifted.get('events'):
+        events = [_shift_result(event, delta, user_tz) for event in shifted['events']]
+        if None in events:
+            return None
+        shifted['events'] = events
+    return shifted
+
+
+class LLMCache:
+    """
+    Двухуровневый кэш ответов LLM: LRU в памяти + SQLite на диске.
+    Ключ — нормализованный текст, таймзона и день «сейчас» в этой таймзоне.
+    Если запрос отличается только абсолютной датой, ответ пересчитывается на новую дату.
+    """
+
+    def __init__(self, path: str = None, max_memory_items: int = None,
+                 max_disk_items: int = None, ttl: float = None):
+        self.path = path or os.getenv('LLM_CACHE_PATH', 'llm_cache.db')
+        self.max_memory_items = max_memory_items or int(os.getenv('LLM_CACHE_SIZE', '1000'))
+        self.max_disk_items = max_disk_items or int(os.getenv('LLM_CACHE_DISK_SIZE', '50000'))
+        self.ttl = ttl or float(os.getenv('LLM_CACHE_TTL', '86400'))
+
+        self._memory = OrderedDict()
+        # память и SQLite — разные блокировки: запись на диск в потоке не задерживает event loop
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = connect(self.path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                dates TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache (created_at)")
+        self._conn.commit()
+        self._inserts = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.reanchored = 0
+        self.evictions = 0
+
+    def _key(self, text: str, user_timezone: str):
+        """(ключ, даты из текста, таймзона) или None, если запрос не кэшируется"""
+        if NOW_RELATIVE.search(text.lower()):
+            return None
+        user_tz = pytz.timezone(user_timezone)
+        today = datetime.now(user_tz).date()
+        template, dates = normalize(text)
+        resolved = _resolve_dates(dates, today)
+        if resolved is None:
+            return None
+        raw_key = f"{template}|{user_timezone}|{today.isoformat()}"
+        return hashlib.sha1(raw_key.encode('utf-8')).hexdigest(), resolved, user_tz
+
+    def _memory_lookup(self, key: str):
+        """Запись (result, dates, created_at) из памяти или None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            self._memory.move_to_end(key)
+            if time.time() - entry[2] < self.ttl:
+                return entry
+            del self._memory[key]
+            return None
+
+    def _disk_lookup(self, key: str):
+        """Запись с диска (поднимается в память) или None; вызывается в отдельном потоке"""
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT result, dates, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row['created_at'] >= self.ttl:
+            return None
+        entry = (row['result'], row['dates'], row['created_at'])
+        with self._lock:
+            self._remember(key, entry)
+        return entry
+
+    def _hit(self, tier: str):
+        if tier == 'memory':
+            self.memory_hits += 1
+        else:
+            self.disk_hits += 1
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, text: str, user_timezone: str):
+        key_info = self._key(text, user_timezone)
+        if key_info is None:
+            return None
+        key, dates, user_tz = key_info
+
+        entry, tier = self._memory_lookup(key), 'memory'
+        if entry is None:
+            # SQLite — в отдельном потоке, чтобы не блокировать event loop
+            entry, tier = await asyncio.to_thread(self._disk_lookup, key), 'disk'
+        if entry is None:
+            self.misses += 1
+            return None
+
+        result = json.loads(entry[0])
+        cached_dates = [date.fromisoformat(d) for d in json.loads(entry[1])]
+        if cached_dates == dates:
+            self._hit(tier)
+            return result
+
+        # тот же запрос с другой датой — сдвигаем результат, если все даты сдвинулись одинаково
+        deltas = {new - old for new, old in zip(dates, cached_dates)}
+        if len(cached_dates) != len(dates) or len(deltas) != 1:
+            self.misses += 1
+            return None
+        shifted = _shift_result(result, deltas.pop(), user_tz)
+        if shifted is None:
+            self.misses += 1
+            return None
+        self._hit(tier)
+        self.reanchored += 1
+        return shifted
+
+    async def put(self, text: str, user_timezone: str, result: dict):
+        if result.get('intent') in (None, 'unknown'):
+            return
+        key_info = self._key(text, user_timezone)
+        if key_info is None:
+            return
+        key, dates, _ = key_info
+        entry = (
+            json.dumps(result, ensure_ascii=False),
+            json.dumps([d.isoformat() for d in dates]),
+            time.time(),
+        )
+        with self._lock:
+            self._remember(key, entry)
+        await asyncio.to_thread(self._disk_put, key, entry)
+
+    def _disk_put(self, key: str, entry):
+        with self._db_lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, result, dates, created_at) VALUES (?, ?, ?, ?)",
+                    (key, *entry)
+                )
+            self._inserts += 1
+            if self._inserts % 100 == 0:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """Удаляет устаревшие записи и самые старые сверх лимита"""
+        with self._conn:
+            cur = self._conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            removed = cur.rowcount
+            cur = self._conn.execute("""
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_disk_items,))
+            removed += cur.rowcount
+        self.evictions += removed
+        if removed:
+            logger.info(f"Кэш LLM: удалено {removed} записей с диска")
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'reanchored': self.reanchored,
+            'evictions': self.evictions,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
@@ -1,86 +1,258 @@
 from datetime import datetime
 
 import openai
+import httpx
 import os
+import re
 import json
+import random
+import asyncio
 import logging
 import pytz
 
+from bot.llm_cache import LLMCache
+from bot.parse_result import ParseResult
+
 
 logger = logging.getLogger(__name__)
-openai.api_key = os.getenv("OPENAI_API_KEY")
+
+LLM_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# потоковый ответ: intent известен раньше, чем весь JSON (LLM_STREAMING=0 — отключить)
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
+
+# поле intent в ещё не законченном JSON
+INTENT_FIELD = re.compile(r'"intent"\s*:\s*"([a-z_]+)"')
+
+# ошибки, после которых имеет смысл повторить запрос
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+_client = None
+_semaphore = None
+_cache = None
+# intent -> накопленные токены
+_token_usage = {}
+
+
+def get_client() -> openai.AsyncOpenAI:
+    """Общий async-клиент OpenAI с пулом соединений (создаётся один раз)"""
+    global _client
+    if _client is None:
+        _client = openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            timeout=LLM_TIMEOUT,
+            # повторы делаем сами, с джиттером и под семафором
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONCURRENCY,
+                    max_keepalive_connections=LLM_MAX_CONCURRENCY,
+                ),
+                timeout=LLM_TIMEOUT,
+            ),
+        )
+    return _client
+
+
+def get_cache():
+    """Общий кэш ответов LLM (None, если выключен через LLM_CACHE_ENABLED=0)"""
+    global _cache
+    if _cache is None and os.getenv("LLM_CACHE_ENABLED", "1") == "1":
+        _cache = LLMCache()
+    return _cache
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
 
 
-async def parse_user_message(text: str, user_timezone: str) -> dict:
+async def _with_retries(request):
     """
-    Отправляет текст пользователя LLM и получает JSON с intent и сущностями.
+    Выполняет await request() под семафором с повторами и джиттером.
+    request делает всю работу целиком (для потока — вместе с чтением ответа),
+    чтобы и лимит параллельности, и повторы распространялись на неё всю.
     """
-    # Получаем текущее время в таймзоне пользователя
-    now = datetime.now(pytz.timezone(user_timezone))
-    now_iso = now.isoformat()
-
-    prompt = f"""
-    Ты — парсер сообщений календаря. Верни JSON с intent и сущностями.
-
-    Текст пользователя: "{text}"
-    Таймзона: {user_timezone}
-    Сейчас: {now_iso}
-
-    Формат JSON:
-    {{
-        "intent": "create_event | query_schedule | find_free_time | track_delivery",
-        "title": "только текст события без даты",
-        "start": "ISO8601 дата и время начала,
-        "end": "ISO8601 дата и время конца",
-        "time_min": "ISO8601 начало периода для query_schedule и find_free_time, если указано",
-        "time_max": "ISO8601 конец периода для query_schedule и find_free_time, если указано",
-        "location": null,
-        "description": null
-    }}
-    
-    Правила парсинга даты и времени:
-    - Всегда используй {now_iso} как "сейчас" (например для расчёта "сегодня/завтра/пятницу/через n часов").
-    - Всегда возвращай временные поля в ISO8601 (YYYY-MM-DDTHH:MM:SS±HH:MM) с учётом таймзоны пользователя.
-    - Если пользователь написал дату или время в тексте — помещай их в "start" и "end" (таймзона пользователя).
-    - Если есть время, но нет даты → используй дату сегодня (в таймзоне пользователя).
-    - Если есть дата, но нет времени → используем 09:00 как start и 10:00 как end (таймзона пользователя).
-    - Дата окончания - start + продолжительность 
-    - Если время окончания не указано для create_event → добавляй 1 час к start.
-    - Если время **не указано** для query_schedule и find_free_time — используй начало и конец дня (00:00 – 23:59) в таймзоне пользователя.
-    - Если дата относительная ("завтра", "в пятницу")  — преобразуй её в точную будущую дату с учётом таймзоны.
-    - Если дата < {now_iso}, добавляй + к дате + 1 год
-    - Распознавай форматы времени: "9:00", "9", "9 00", "9.00", "9 часов", "9 утра", "3 дня", "7 вечера".
-    - Если нет даты и времени → оставь start и end (или time_min/time_max) равными null.
-    - Если не удалось определить title — верни title = null.
-    - Старайся извлечь location, если пользователь указал адрес/место/метро/улицу.
-    
-    Правила для формирования json:
-    - убирай из title дату и время 
-    - дополнительную информацию относи в description
-    - Всегда возвращай поле "intent".
-    - Для intent == "create_event":
-      - Если title == null → верни JSON с title=null (и другими полями, если распознаны).
-      - Если start == null и end == null → верни JSON с start=null и end=null.
-    - Для intent in ("query_schedule","find_free_time"):
-      - Если time_min == null и time_max == null → верни JSON с time_min=null и time_max=null.
-    - Не добавляй ничего кроме указанных полей. Возвращай **только** валидный JSON.
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            async with _get_semaphore():
+                return await request()
+        except RETRYABLE_ERRORS as e:
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            # экспоненциальная задержка с полным джиттером
+            delay = random.uniform(0, min(8.0, 0.5 * 2 ** attempt))
+            logger.warning(f"Ошибка LLM ({e.__class__.__name__}), повтор через {delay:.2f} с")
+            await asyncio.sleep(delay)
+
+
+async def _create_completion(**kwargs):
+    """Запрос к LLM с ограничением параллельности и повторами с джиттером"""
+    return await _with_retries(lambda: get_client().chat.completions.create(**kwargs))
+
+
+async def _stream_completion(on_intent, **kwargs):
+    """
+    Потоковый запрос: как только в ответе появляется intent, вызывается on_intent(intent).
+    Обрыв посреди потока повторяется, как и любой другой сбой запроса; on_intent вызывается один раз.
+    :return: (полный текст ответа, usage)
+    """
+    intent_announced = False
+
+    async def consume():
+        nonlocal intent_announced
+        parts = []
+        usage = None
+        stream = await get_client().chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+        # поток закрывается и при исключении внутри цикла
+        async with stream:
+            async for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                parts.append(chunk.choices[0].delta.content)
+                if not intent_announced:
+                    match = INTENT_FIELD.search("".join(parts))
+                    if match:
+                        intent_announced = True
+                        try:
+                            on_intent(match.group(1))
+                        except Exception:
+                            logger.exception("Ошибка в обработчике раннего intent")
+        return "".join(parts), usage
+
+    return await _with_retries(consume)
+
+
+async def close_client():
+    """Закрывает соединения клиента при остановке бота"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+# Статичная часть промпта: одинакова для всех запросов, поэтому кэшируется на стороне API
+# (prompt caching срабатывает на совпадающем префиксе). Всё переменное — в сообщении пользователя.
+SYSTEM_PROMPT = """Ты — парсер сообщений календаря. Отвечай только JSON-объектом:
+{"intent": "create_event|query_schedule|find_free_time|track_delivery",
+"title": str|null, "start": ISO|null, "end": ISO|null, "time_min": ISO|null, "time_max": ISO|null,
+"location": str|null, "description": str|null, "events": [{"title","start","end","location","description"}]|null}
+
+Время:
+- ISO — YYYY-MM-DDTHH:MM:SS±HH:MM в таймзоне пользователя; "сегодня/завтра/в пятницу/через n часов" считай от поля «Сейчас».
+- Есть время без даты → сегодня. Есть дата без времени → 09:00–10:00.
+- create_event без конца → start + 1 час. Дата в прошлом → тот же день в следующем году.
+- query_schedule и find_free_time: period в time_min/time_max; без времени — 00:00–23:59 дня.
+- Форматы времени: "9:00", "9", "9 00", "9.00", "9 часов", "9 утра", "3 дня", "7 вечера".
+- Нет даты и времени → временные поля null.
+
+Поля:
+- title — только суть события, без даты и времени; не удалось определить → null.
+- location — адрес, место, метро, улица; прочие детали — в description.
+- Несколько событий (расписание, список, повторение на период) → intent create_event, каждое вхождение
+  отдельным элементом events (повторения разворачивай в даты, не больше 100), верхние поля — первое событие.
+  Одно событие → events null.
+- Если дан «Предыдущий разбор», дополни его «Уточнением», сохранив уже известные поля."""
+
+
+WEEKDAYS = ('понедельник', 'вторник', 'среда', 'четверг', 'пятница', 'суббота', 'воскресенье')
+
+
+def build_user_message(text: str, user_timezone: str, now: datetime, previous: dict = None) -> str:
+    """Переменная часть промпта: только то, что меняется от запроса к запросу"""
+    lines = [
+        f"Сейчас: {now.isoformat(timespec='minutes')}, {WEEKDAYS[now.weekday()]}",
+        f"Таймзона: {user_timezone}",
+    ]
+    if previous:
+        lines.append(f"Предыдущий разбор: {json.dumps(previous, ensure_ascii=False, separators=(',', ':'))}")
+    lines.append(f"Текст: {text}")
+    return "\n".join(lines)
+
+
+def compact_previous(result: dict) -> dict:
+    """Предыдущий разбор для уточнения: только заполненные поля, без сырого ответа"""
+    return {k: v for k, v in result.items() if v not in (None, '', []) and k != 'raw'}
+
+
+def _log_usage(intent: str, usage):
+    """Учёт токенов по intent: сколько стоит и насколько попадает в кэш промпта каждый тип сообщений"""
+    if usage is None:
+        return
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', 0) or 0
+    stats = _token_usage.setdefault(intent, {'calls': 0, 'prompt': 0, 'cached': 0, 'completion': 0})
+    stats['calls'] += 1
+    stats['prompt'] += usage.prompt_tokens
+    stats['cached'] += cached
+    stats['completion'] += usage.completion_tokens
+    logger.info(f"Токены LLM ({intent}): prompt={usage.prompt_tokens} (из кэша {cached}), "
+                f"completion={usage.completion_tokens}")
+
+
+def token_usage() -> dict:
+    """Накопленные токены по intent: {'create_event': {'calls', 'prompt', 'cached', 'completion'}}"""
+    return {intent: dict(stats) for intent, stats in _token_usage.items()}
+
+
+async def parse_user_message(text: str, user_timezone: str, previous: dict = None,
+                             on_intent=None) -> ParseResult:
+    """
+    Отправляет текст пользователя LLM и получает разобранный результат с intent и сущностями.
+    :param previous: предыдущий частичный разбор при уточнении (см. compact_previous)
+    :param on_intent: вызывается с intent, как только он пришёл в потоке, — до конца ответа
+    Повторные запросы без previous отдаются из кэша.
     """
+    user_tz = pytz.timezone(user_timezone)
+    cache = get_cache() if previous is None else None
+    if cache:
+        cached = await cache.get(text, user_timezone)
+        if cached is not None:
+            logger.info(f"Ответ LLM из кэша, статистика: {cache.stats}")
+            return ParseResult.from_dict(cached, user_tz)
+
+    # Получаем текущее время в таймзоне пользователя
+    now = datetime.now(user_tz)
 
     logger.info("Отправляю в LLM")
 
-    response = openai.chat.completions.create(
+    request = dict(
         model="gpt-5-nano",
-        messages=[{"role": "user", "content": prompt}],
-        # temperature=0
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": build_user_message(text, user_timezone, now, previous)},
+        ],
+        # ответ гарантированно валидный JSON-объект
+        response_format={"type": "json_object"},
     )
+    if on_intent is not None and LLM_STREAMING:
+        text_response, usage = await _stream_completion(on_intent, **request)
+    else:
+        response = await _create_completion(**request)
+        text_response, usage = response.choices[0].message.content, getattr(response, "usage", None)
 
-    text_response = response.choices[0].message.content.strip()
+    text_response = text_response.strip()
     logger.info(f"Ответ LLM: {text_response}")
 
-    try:
-        result = json.loads(text_response)
-    except json.JSONDecodeError:
-        logger.error("LLM вернула невалидный JSON")
-        result = {"intent": "unknown", "raw": text_response}
+    # обёртки, хвосты и даты без смещения чинятся при разборе — повторный запрос не нужен
+    result = ParseResult.from_llm_text(text_response, user_tz)
+    if result.raw is not None:
+        logger.error("LLM вернула ответ без JSON-объекта")
+
+    _log_usage(result.intent, usage)
 
+    if cache:
+        await cache.put(text, user_timezone, result.to_dict())
     return result
@@ -0,0 +1,208 @@
+import os
+import re
+import time
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pytz
+
+from bot.time_parser import TIME_RANGE, parse_event_datetime, parse_date_range
+from bot.llm_parser import parse_user_message
+from bot.parse_result import ParseResult
+
+logger = logging.getLogger(__name__)
+
+LocalParse = namedtuple("LocalParse", ["result", "confidence"])
+
+INTENT_PATTERNS = {
+    'find_free_time': re.compile(r'свобод|окошк|\bокн[оа]\b'),
+    'query_schedule': re.compile(
+        r'что у меня|расписани|что запланир|какие у меня|мои (?:дела|встречи|события|планы)|покажи'
+    ),
+}
+DATE_PATTERN = re.compile(
+    r'сегодня|послезавтра|завтра|через\s+(?:\d+\s*)?(?:час|минут|полчаса)|полчаса'
+    r'|\b\d{1,2}[.]\d{1,2}\b'
+    r'|\b\d{1,2}\s+(?:января|февраля|марта|апреля|мая|июня|июля|августа|сентября|октября|ноября|декабря)'
+    r'|понедельник|вторник|сред[ау]|четверг|пятниц|суббот|воскресень'
+)
+TIME_PATTERN = re.compile(
+    r'\bв\s*\d{1,2}(?:[:.]\d{2})?\b|\b\d{1,2}[:.]\d{2}\b|\b(?:с|от)\s*\d{1,2}(?:[:.]\d{2})?\s*(?:до|-)'
+    r'|\b\d{1,2}\s*(?:утра|вечера|дня|час)|через'
+)
+# признаки места и деталей, которые локальный парсер не вытаскивает
+LOCATION_PATTERN = re.compile(r'\bул\.|улиц|метро|адрес|офис|кафе|ресторан|\bна\s+[А-ЯA-Z]')
+# расписания и повторяющиеся события — локальный парсер умеет только одно событие
+MULTI_EVENT_PATTERN = re.compile(
+    r'\n\s*\S|кажд|по\s+(?:пн|вт|ср|чт|пт|сб|вс|будн|выходн|понедельникам|вторникам|средам|четвергам'
+    r'|пятницам|субботам|воскресеньям)|\bвесь\s|\bвсю\s|\bвсе\s+(?:дни|выходные|будни)'
+)
+# предлоги, оставшиеся на краях заголовка после вырезания даты и времени
+DANGLING_PREPOSITIONS = re.compile(r'^(?:(?:в|во|с|со|к|на|а)\s+)+|(?:\s+(?:в|во|с|со|к|на))+$')
+
+
+def _detect_intent(text_lower: str):
+    """Возвращает (intent, однозначен ли он)"""
+    matched = [intent for intent, pattern in INTENT_PATTERNS.items() if pattern.search(text_lower)]
+    if len(matched) > 1:
+        return matched[0], False
+    if matched:
+        return matched[0], True
+    return 'create_event', True
+
+
+def _local_query(text_lower: str, intent: str, user_timezone: str) -> LocalParse:
+    """Период для query_schedule / find_free_time"""
+    user_tz = pytz.timezone(user_timezone)
+    now = datetime.now(pytz.utc).astimezone(user_tz)
+
+    hours = TIME_RANGE.search(text_lower)
+    _, range_start, range_end = parse_date_range(text_lower, now, user_tz)
+    if range_start:
+        time_min = range_start.replace(hour=0, minute=0)
+        time_max = range_end.replace(hour=23, minute=59)
+        # часы внутри диапазона дней («с пн по пт с 10 до 12») — пусть разбирает LLM
+        confidence = 0.5 if hours else 0.9
+    elif DATE_PATTERN.search(text_lower) or hours:
+        try:
+            _, start_dt, end_dt = parse_event_datetime(text_lower, user_timezone)
+        except ValueError:
+            return LocalParse(None, 0.0)
+        if hours:
+            # «завтра с 10 до 12» — только эти часы (конец после полуночи уже перенесён на следующий день)
+            time_min, time_max = start_dt, end_dt
+        else:
+            time_min = start_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+            time_max = time_min.replace(hour=23, minute=59)
+        confidence = 0.9
+    else:
+        # период не указан — как и LLM, берём сегодняшний день, но уверенность низкая
+        time_min = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        time_max = time_min.replace(hour=23, minute=59)
+        confidence = 0.6
+
+    return LocalParse(ParseResult(intent=intent, time_min=time_min, time_max=time_max), confidence)
+
+
+def _local_event(text: str, text_lower: str, user_timezone: str) -> LocalParse:
+    """Событие для create_event"""
+    if not DATE_PATTERN.search(text_lower) and not TIME_PATTERN.search(text_lower):
+        return LocalParse(None, 0.0)
+    try:
+        title, start_dt, end_dt = parse_event_datetime(text, user_timezone)
+    except ValueError:
+        return LocalParse(None, 0.0)
+
+    title = DANGLING_PREPOSITIONS.sub('', title).strip()
+    now = datetime.now(start_dt.tzinfo)
+
+    confidence = 1.0
+    if start_dt < now - timedelta(hours=1):
+        # дата в прошлом — LLM переносит такие даты вперёд, локальный парсер нет
+        confidence -= 0.5
+    if not TIME_PATTERN.search(text_lower):
+        # время подставлено по умолчанию (09:00)
+        confidence -= 0.2
+    if re.search(r'\d', title):
+        # в заголовке остались цифры — скорее всего дата/время разобраны не полностью
+        confidence -= 0.5
+    if title == "Напоминание" or len(title) < 3:
+        confidence -= 0.4
+    if len(title.split()) > 6:
+        confidence -= 0.2
+    if LOCATION_PATTERN.search(text):
+        confidence -= 0.3
+
+    result = ParseResult(intent='create_event', title=title[:1].upper() + title[1:], start=start_dt, end=end_dt)
+    return LocalParse(result, max(confidence, 0.0))
+
+
+def local_parse(text: str, user_timezone: str) -> LocalParse:
+    """
+    Разбор сообщения без LLM.
+    Возвращает ParseResult (как parse_user_message) и уверенность 0..1.
+    """
+    text_lower = text.lower().strip()
+    intent, unambiguous = _detect_intent(text_lower)
+    if not unambiguous:
+        return LocalParse(None, 0.0)
+    if intent == 'create_event':
+        if MULTI_EVENT_PATTERN.search(text_lower.strip()):
+            return LocalParse(None, 0.0)
+        return _local_event(text, text_lower, user_timezone)
+    return _local_query(text_lower, intent, user_timezone)
+
+
+class ParsePipeline:
+    """
+    Многоуровневый разбор сообщений: сначала локальный парсер,
+    LLM вызывается только при низкой уверенности.
+    """
+
+    def __init__(self, llm_parse=parse_user_message, min_confidence: float = None):
+        self.llm_parse = llm_parse
+        self.min_confidence = min_confidence if min_confidence is not None else float(
+            os.getenv('FAST_PATH_MIN_CONFIDENCE', '0.8')
+        )
+        # статистика быстрого пути пишется в лог каждые N разборов
+        self.stats_interval = int(os.getenv('FAST_PATH_STATS_INTERVAL', '100'))
+        self.total = 0
+        self.fast_path_hits = 0
+        self.llm_calls = 0
+        self.latency_saved = 0.0
+        # скользящее среднее времени ответа LLM, до первого замера — типичные 3 с
+        self.llm_latency_avg = 3.0
+
+    async def parse(self, text: str, user_timezone: str, use_fast_path: bool = True,
+                    previous: dict = None, on_intent=None) -> ParseResult:
+        """
+        :param previous: предыдущий разбор при уточнении (только для LLM)
+        :param on_intent: ранний intent из потокового ответа LLM (см. parse_user_message)
+        """
+        self.total += 1
+
+        if use_fast_path:
+            started = time.perf_counter()
+            try:
+                local = local_parse(text, user_timezone)
+            except Exception:
+                logger.exception("Ошибка локального парсера")
+                local = LocalParse(None, 0.0)
+            local_elapsed = time.perf_counter() - started
+
+            if local.result and local.confidence >= self.min_confidence:
+                self.fast_path_hits += 1
+                self.latency_saved += max(self.llm_latency_avg - local_elapsed, 0.0)
+                logger.info(f"Быстрый путь: intent={local.result.intent}, "
+                            f"уверенность={local.confidence:.2f}, {local_elapsed * 1000:.1f} мс")
+                self._report()
+                return local.result
+            logger.info(f"Локальный парсер не уверен ({local.confidence:.2f}), вызываю LLM")
+
+        started = time.perf_counter()
+        kwargs = {}
+        if previous is not None:
+            kwargs['previous'] = previous
+        if on_intent is not None:
+            kwargs['on_intent'] = on_intent
+        result = await self.llm_parse(text, user_timezone, **kwargs)
+        elapsed = time.perf_counter() - started
+        self.llm_calls += 1
+        self.llm_latency_avg = 0.8 * self.llm_latency_avg + 0.2 * elapsed
+        self._report()
+        return result
+
+    def _report(self):
+        if self.stats_interval and self.total % self.stats_interval == 0:
+            logger.info(f"Статистика быстрого пути: {self.stats}")
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'total': self.total,
+            'fast_path_hits': self.fast_path_hits,
+            'llm_calls': self.llm_calls,
+            'fast_path_hit_rate': self.fast_path_hits / self.total if self.total else 0.0,
+            'latency_saved_sec': round(self.latency_saved, 3),
+        }
@@ -0,0 +1,153 @@
+import re
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+INTENTS = ('create_event', 'query_schedule', 'find_free_time', 'track_delivery')
+NULL_STRINGS = ('', 'null', 'none')
+
+FENCE = re.compile(r'^```[a-zA-Z]*\s*|\s*```$')
+TRAILING_COMMA = re.compile(r',\s*([}\]])')
+_decoder = json.JSONDecoder()
+
+
+def decode_json_object(text: str) -> Optional[dict]:
+    """
+    JSON-объект из ответа LLM. Чинит типичные огрехи: ```json-обёртку,
+    текст до и после объекта, висячие запятые. None — если объекта нет.
+    """
+    text = FENCE.sub('', text.strip())
+    start = text.find('{')
+    if start < 0:
+        return None
+    text = text[start:]
+    for candidate in (text, TRAILING_COMMA.sub(r'\1', text)):
+        try:
+            # raw_decode останавливается в конце объекта и не смотрит на хвост
+            obj, _ = _decoder.raw_decode(candidate)
+        except ValueError:
+            continue
+        if isinstance(obj, dict):
+            return obj
+    return None
+
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return None if value.lower() in NULL_STRINGS else value
+
+
+def parse_datetime(value, user_tz) -> Optional[datetime]:
+    """ISO8601 -> datetime; без смещения — считается временем в таймзоне пользователя"""
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        value = _text(value)
+        if value is None:
+            return None
+        if value.endswith(('Z', 'z')):
+            value = value[:-1] + '+00:00'
+        try:
+            dt = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if dt.tzinfo is None and user_tz is not None:
+        dt = user_tz.localize(dt)
+    return dt
+
+
+def _iso(dt: Optional[datetime]) -> Optional[str]:
+    return dt.isoformat() if dt else None
+
+
+@dataclass(slots=True)
+class EventFields:
+    title: Optional[str] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    location: Optional[str] = None
+    description: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: dict, user_tz) -> 'EventFields':
+        return cls(
+            title=_text(data.get('title')),
+            start=parse_datetime(data.get('start'), user_tz),
+            end=parse_datetime(data.get('end'), user_tz),
+            location=_text(data.get('location')),
+            description=_text(data.get('description')),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            'title': self.title,
+            'start': _iso(self.start),
+            'end': _iso(self.end),
+            'location': self.location,
+            'description': self.description,
+        }
+
+
+@dataclass(slots=True)
+class ParseResult:
+    """
+    Результат разбора сообщения (локальным парсером или LLM).
+    Даты разбираются один раз — при создании из JSON, дальше это datetime с таймзоной.
+    """
+    intent: str = 'unknown'
+    title: Optional[str] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    time_min: Optional[datetime] = None
+    time_max: Optional[datetime] = None
+    location: Optional[str] = None
+    description: Optional[str] = None
+    events: List[EventFields] = field(default_factory=list)
+    # исходный ответ, если разобрать его не удалось
+    raw: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: dict, user_tz) -> 'ParseResult':
+        intent = (_text(data.get('intent')) or '').lower()
+        events = data.get('events')
+        return cls(
+            intent=intent if intent in INTENTS else 'unknown',
+            title=_text(data.get('title')),
+            start=parse_datetime(data.get('start'), user_tz),
+            end=parse_datetime(data.get('end'), user_tz),
+            time_min=parse_datetime(data.get('time_min'), user_tz),
+            time_max=parse_datetime(data.get('time_max'), user_tz),
+            location=_text(data.get('location')),
+            description=_text(data.get('description')),
+            events=[
+                EventFields.from_dict(item, user_tz) for item in events if isinstance(item, dict)
+            ] if isinstance(events, list) else [],
+            raw=data.get('raw'),
+        )
+
+    @classmethod
+    def from_llm_text(cls, text: str, user_tz) -> 'ParseResult':
+        data = decode_json_object(text)
+        if data is None:
+            return cls(raw=text)
+        return cls.from_dict(data, user_tz)
+
+    def to_dict(self) -> dict:
+        """JSON-совместимый вид (для кэша и уточнений)"""
+        result = {
+            'intent': self.intent,
+            'title': self.title,
+            'start': _iso(self.start),
+            'end': _iso(self.end),
+            'time_min': _iso(self.time_min),
+            'time_max': _iso(self.time_max),
+            'location': self.location,
+            'description': self.description,
+            'events': [event.to_dict() for event in self.events] or None,
+        }
+        if self.raw is not None:
+            result['raw'] = self.raw
+        return result
@@ -0,0 +1,202 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from bot.db import connect
+from bot.sharding import shard_key
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderStore:
+    """
+    Очередь напоминаний в SQLite, упорядоченная по времени срабатывания.
+    При нескольких процессах бота каждый видит только свою часть очереди:
+    напоминания с shard_key % shards == shard. shard_key считается по user_id —
+    по тому же ключу диспетчер раскладывает апдейты, поэтому напоминание из группового
+    чата попадает в очередь процесса, который его создал и будит свой диспетчер.
+    """
+
+    def __init__(self, db_file: str = None, shard: int = 0, shards: int = 1):
+        self.db_file = db_file or os.getenv('REMINDERS_DB', 'reminders.db')
+        self.shard = shard
+        self.shards = shards
+        self._lock = threading.Lock()
+        self._conn = connect(self.db_file)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS reminders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    fire_at REAL NOT NULL,
+                    event_at REAL NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    user_id INTEGER,
+                    text TEXT NOT NULL,
+                    shard_key INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(reminders)")}
+            if 'shard_key' not in columns:
+                # очередь, созданная до шардирования: старые напоминания достаются шарду 0
+                self._conn.execute("ALTER TABLE reminders ADD COLUMN shard_key INTEGER NOT NULL DEFAULT 0")
+            if 'user_id' not in columns:
+                self._conn.execute("ALTER TABLE reminders ADD COLUMN user_id INTEGER")
+            if 'attempts' not in columns:
+                self._conn.execute("ALTER TABLE reminders ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS reminders_fire_at ON reminders (fire_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS reminders_event ON reminders (chat_id, event_at)")
+
+    def add(self, chat_id: int, user_id: int, fire_at: datetime, event_at: datetime, text: str):
+        """
+        Добавляет напоминание; если в чате уже есть напоминание об этом событии
+        (то же время и текст — повторное подтверждение), ничего не делает и возвращает None.
+        """
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO reminders (fire_at, event_at, chat_id, user_id, text, shard_key) "
+                "SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS "
+                "(SELECT 1 FROM reminders WHERE chat_id = ? AND event_at = ? AND text = ?)",
+                (fire_at.timestamp(), event_at.timestamp(), chat_id, user_id, text, shard_key(user_id),
+                 chat_id, event_at.timestamp(), text)
+            )
+            return cur.lastrowid if cur.rowcount else None
+
+    def next_fire_at(self):
+        """Время ближайшего напоминания (timestamp) или None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(fire_at) AS fire_at FROM reminders WHERE shard_key % ? = ?", (self.shards, self.shard)
+            ).fetchone()
+        return row['fire_at']
+
+    def due(self, until: float, limit: int):
+        """Напоминания, которые должны сработать не позже until"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, event_at, chat_id, text, attempts FROM reminders "
+                "WHERE fire_at <= ? AND shard_key % ? = ? ORDER BY fire_at LIMIT ?",
+                (until, self.shards, self.shard, limit)
+            ).fetchall()
+
+    def delete(self, ids):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM reminders WHERE id = ?", [(i,) for i in ids])
+
+    def retry(self, retries):
+        """retries: [(id, новое fire_at)] — переносит напоминания и увеличивает счётчик попыток"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE reminders SET fire_at = ?, attempts = attempts + 1 WHERE id = ?",
+                [(fire_at, reminder_id) for reminder_id, fire_at in retries]
+            )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM reminders WHERE shard_key % ? = ?", (self.shards, self.shard)
+            ).fetchone()[0]
+
+
+class ReminderScheduler:
+    """
+    Один диспетчер на все напоминания: спит до ближайшего срабатывания,
+    отправляет пачкой всё, что наступило, и переживает перезапуск бота.
+    """
+
+    def __init__(self, store: ReminderStore = None, batch_window: float = None, batch_size: int = None):
+        self.store = store or ReminderStore()
+        # напоминания, срабатывающие в пределах окна, отправляются вместе
+        self.batch_window = batch_window or float(os.getenv('REMINDER_BATCH_WINDOW', '1'))
+        self.batch_size = batch_size or int(os.getenv('REMINDER_BATCH_SIZE', '100'))
+        # неудачная отправка повторяется с растущей паузой, но не больше max_attempts раз
+        self.max_attempts = int(os.getenv('REMINDER_MAX_ATTEMPTS', '5'))
+        self.retry_delay = float(os.getenv('REMINDER_RETRY_DELAY', '15'))
+        self._bot = None
+        self._task = None
+        self._wakeup = asyncio.Event()
+
+    def start(self, bot):
+        """Запускает диспетчер; неотправленные напоминания подхватываются из хранилища"""
+        self._bot = bot
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Диспетчер напоминаний запущен, в очереди: {self.store.count()}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, chat_id: int, user_id: int, fire_at: datetime, event_at: datetime, text: str):
+        """user_id — кто создал напоминание: по нему выбирается процесс, который его отправит"""
+        if self.store.add(chat_id, user_id, fire_at, event_at, text) is None:
+            return
+        # диспетчер мог заснуть до более позднего напоминания
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                self._wakeup.clear()
+                next_fire_at = self.store.next_fire_at()
+                delay = None if next_fire_at is None else next_fire_at - time.time()
+                if delay is None or delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._dispatch_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Ошибка в диспетчере напоминаний")
+                await asyncio.sleep(5)
+
+    async def _dispatch_due(self):
+        now = time.time()
+        reminders = self.store.due(now + self.batch_window, self.batch_size)
+        # событие уже началось (например, бот долго был выключен) — напоминать поздно
+        actual = [r for r in reminders if r['event_at'] > now]
+        results = await asyncio.gather(
+            *(self._bot.send_message(chat_id=r['chat_id'], text=r['text']) for r in actual),
+            return_exceptions=True
+        )
+        done = [r['id'] for r in reminders if r['event_at'] <= now]
+        retries = []
+        sent = 0
+        for reminder, result in zip(actual, results):
+            if not isinstance(result, Exception):
+                done.append(reminder['id'])
+                sent += 1
+                continue
+            attempt = reminder['attempts'] + 1
+            # бот заблокирован или чат не найден — повтор не поможет
+            permanent = isinstance(result, (Forbidden, BadRequest))
+            if permanent or attempt >= self.max_attempts:
+                logger.error(f"Не удалось отправить напоминание {reminder['id']} "
+                             f"(попытка {attempt}), удаляю: {result}")
+                done.append(reminder['id'])
+                continue
+            if isinstance(result, RetryAfter):
+                # Telegram сам сообщает, сколько ждать
+                delay = float(result.retry_after)
+            else:
+                delay = self.retry_delay * 2 ** (attempt - 1)
+            logger.warning(f"Не удалось отправить напоминание {reminder['id']} "
+                           f"(попытка {attempt}), повтор через {delay:.0f} с: {result}")
+            retries.append((reminder['id'], now + delay))
+        self.store.delete(done)
+        if retries:
+            self.store.retry(retries)
+        logger.info(f"Отправлено напоминаний: {sent}, отложено до повтора: {len(retries)}, "
+                    f"пропущено устаревших: {len(reminders) - len(actual)}")
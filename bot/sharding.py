@@ -0,0 +1,142 @@
+"""
+Шардированный запуск бота: один процесс-диспетчер получает апдейты от Telegram
+(polling или webhook) и раскладывает их по N процессам-обработчикам по хэшу user_id.
+
+Все апдейты пользователя всегда попадают в один и тот же процесс, поэтому его
+context.user_data (waiting_for, awaiting_clarify, pending_event) и фоновые задачи
+остаются на месте; состояние диалогов к тому же сохраняется в bot/conversation_store.py. Общие данные — пользователи, напоминания, кэши — лежат в SQLite (WAL),
+к которому обращаются все процессы; напоминания делятся между процессами по user_id
+создавшего их пользователя — тем же ключом, что и апдейты.
+"""
+import os
+import zlib
+import queue
+import asyncio
+import logging
+import multiprocessing
+
+from telegram import Update
+from telegram.ext import Application, ApplicationHandlerStop, TypeHandler
+
+from bot.user_manager import create_storage
+from bot.webhook import serve
+
+logger = logging.getLogger(__name__)
+
+
+def shard_key(key) -> int:
+    """Стабильный между процессами хэш (hash() в Python рандомизирован)"""
+    return zlib.crc32(str(key).encode())
+
+
+def shard_for(key, shards: int) -> int:
+    return shard_key(key) % shards
+
+
+def _routing_key(update: Update):
+    """По пользователю: так же PTB раскладывает context.user_data"""
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return 0
+
+
+# ---------------- ОБРАБОТЧИК ----------------
+def _worker_main(shard: int, shards: int, updates):
+    asyncio.run(_serve_shard(shard, shards, updates))
+
+
+async def _serve_shard(shard: int, shards: int, updates):
+    from bot.telegram_calendar_bot import TelegramCalendarBot
+
+    bot = TelegramCalendarBot(shard=shard, shards=shards)
+    app = bot.build_application()
+    await app.initialize()
+    await app.post_init(app)
+    await app.start()
+    logger.info(f"Обработчик {shard + 1}/{shards} запущен (pid {os.getpid()})")
+    try:
+        while True:
+            data = await asyncio.to_thread(updates.get)
+            if data is None:
+                break
+            await app.update_queue.put(Update.de_json(data, app.bot))
+    finally:
+        await app.stop()
+        await app.shutdown()
+        await app.post_shutdown(app)
+
+
+# ---------------- ДИСПЕТЧЕР ----------------
+class ShardDispatcher:
+    """Получает апдейты и раскладывает их по процессам-обработчикам; упавший обработчик перезапускается"""
+
+    def __init__(self, token: str, shards: int, queue_size: int = None):
+        self.token = token
+        self.shards = shards
+        self.queue_size = queue_size or int(os.getenv('BOT_SHARD_QUEUE_SIZE', '1000'))
+        # spawn: дочерние процессы не наследуют потоки и соединения SQLite родителя
+        self._mp = multiprocessing.get_context('spawn')
+        self._queues = [self._mp.Queue(self.queue_size) for _ in range(shards)]
+        self._processes = [None] * shards
+        self._monitor = None
+
+    def _start_worker(self, shard: int):
+        process = self._mp.Process(
+            target=_worker_main, args=(shard, self.shards, self._queues[shard]),
+            name=f'bot-shard-{shard}', daemon=True
+        )
+        process.start()
+        self._processes[shard] = process
+
+    async def _watch_workers(self):
+        while True:
+            await asyncio.sleep(5)
+            for shard, process in enumerate(self._processes):
+                if not process.is_alive():
+                    logger.error(f"Обработчик {shard} завершился (код {process.exitcode}), перезапускаю")
+                    self._start_worker(shard)
+
+    async def _route(self, update: Update, context):
+        updates = self._queues[shard_for(_routing_key(update), self.shards)]
+        data = update.to_dict()
+        try:
+            updates.put_nowait(data)
+        except queue.Full:
+            # обработчик не успевает — ждём место, не блокируя event loop
+            await asyncio.to_thread(updates.put, data)
+        raise ApplicationHandlerStop
+
+    async def _post_init(self, app: Application):
+        for shard in range(self.shards):
+            self._start_worker(shard)
+        self._monitor = asyncio.create_task(self._watch_workers())
+
+    async def _post_shutdown(self, app: Application):
+        if self._monitor:
+            self._monitor.cancel()
+        for updates in self._queues:
+            try:
+                updates.put(None, timeout=5)
+            except queue.Full:
+                pass
+        for process in self._processes:
+            if process:
+                process.join(timeout=30)
+                if process.is_alive():
+                    process.terminate()
+
+    def run(self):
+        # миграция users_data.json -> SQLite выполняется один раз здесь, до запуска обработчиков
+        create_storage()
+        app = (
+            Application.builder()
+            .token(self.token)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
+        app.add_handler(TypeHandler(Update, self._route))
+        logger.info(f"Диспетчер запущен, обработчиков: {self.shards}, режим: {os.getenv('BOT_MODE', 'polling')}")
+        serve(app)
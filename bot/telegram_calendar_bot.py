@@ -1,21 +1,22 @@
 import os
 import logging
 import asyncio
-import pytz
-import re
-import json
 from datetime import datetime, timedelta
-from timezonefinder import TimezoneFinder
-from geopy.geocoders import Nominatim
-from dateparser.search import search_dates
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from telegram.ext import Application, MessageHandler, filters, ContextTypes, CallbackQueryHandler, CommandHandler
 from urllib.parse import quote_plus
 
 from bot.user_manager import UserManager
-from bot.time_parser import parse_time_from_text
-from bot.llm_parser import parse_user_message
-from bot.google_calendar_manager import GoogleCalendarManager
+from bot.timezone_resolver import get_resolver
+from bot.time_parser import parse_event_datetime
+from bot.llm_parser import close_client, compact_previous
+from bot.parse_pipeline import ParsePipeline
+from bot.parse_result import ParseResult
+from bot.reminder_scheduler import ReminderScheduler, ReminderStore
+from bot.async_calendar_manager import AsyncGoogleCalendarManager
+from bot.update_processor import PerChatUpdateProcessor
+from bot.webhook import serve
+from bot.conversation_store import ConversationPersistence
 
 
 # ---------------- ЛОГИ ----------------
@@ -27,259 +28,59 @@ logger = logging.getLogger(__name__)
 
 # ---------------- ФУНКЦИИ ----------------
 def parse_timezone(input_str: str):
-    input_str = input_str.strip()
-    # UTC смещение
-    match = re.match(r'([+-]?\d{1,2})$', input_str)
-    if match:
-        offset_hours = int(match.group(1))
-        return f"Etc/GMT{-offset_hours:+d}"
-    # По названию города
-    try:
-        geolocator = Nominatim(user_agent="timezone_bot", timeout=10)
-        location = geolocator.geocode(input_str)
-        if location:
-            tf = TimezoneFinder()
-            tz_name = tf.timezone_at(lng=location.longitude, lat=location.latitude)
-            if tz_name:
-                return tz_name
-    except Exception:
-        pass
-    # Поиск по частичному совпадению
-    for tz in pytz.all_timezones:
-        if input_str.lower() in tz.lower():
-            return tz
-    return None
-
-
-def parse_date_range(text_lower, now, user_tz):
-    months = {
-        'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5,
-        'июня': 6, 'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10,
-        'ноября': 11, 'декабря': 12
-    }
-    weekdays = {
-        'понедельника': 0, 'вторника': 1, 'среды': 2, 'четверга': 3,
-        'пятницы': 4, 'субботы': 5, 'воскресенья': 6
-    }
-
-    start_datetime = None
-    end_datetime = None
-
-    # --- диапазон дат: числа/текст/год ---
-    date_range_match = re.search(
-        r'с\s+(\d{1,2})(?:[.](\d{1,2}))?\s*(\w+)?(?:\s*(\d{4}))?\s*(?:по|-)\s+(\d{1,2})(?:[.](\d{1,2}))?\s*(\w+)?(?:\s*(\d{4}))?',
-        text_lower
-    )
-
-    if date_range_match:
-        start_day = int(date_range_match.group(1))
-        start_month_num = date_range_match.group(2)
-        start_month_text = date_range_match.group(3)
-        start_year_num = date_range_match.group(4)
-        end_day = int(date_range_match.group(5))
-        end_month_num = date_range_match.group(6)
-        end_month_text = date_range_match.group(7)
-        end_year_num = date_range_match.group(8)
-
-        start_month = int(start_month_num) if start_month_num else months.get(start_month_text, now.month)
-        end_month = int(end_month_num) if end_month_num else months.get(end_month_text, start_month)
-
-        start_year = int(start_year_num) if start_year_num else now.year
-        end_year = int(end_year_num) if end_year_num else start_year
-
-        start_datetime = user_tz.localize(datetime(start_year, start_month, start_day, 9, 0))
-        end_datetime = user_tz.localize(datetime(end_year, end_month, end_day, 18, 0))
-        text_lower = text_lower.replace(date_range_match.group(0), '')
-
-    # --- дни недели ---
-    if not start_datetime:
-        m = re.search(r'с\s+(\w+)\s*(?:до|по)\s*(\w+)', text_lower)
-        if m and m.group(1) in weekdays and m.group(2) in weekdays:
-            start_weekday = weekdays[m.group(1)]
-            end_weekday = weekdays[m.group(2)]
-            days_ahead = (start_weekday - now.weekday() + 7) % 7
-            start_datetime = (now + timedelta(days=days_ahead)).replace(hour=9, minute=0, second=0, microsecond=0)
-            days_diff = (end_weekday - start_weekday + 7) % 7
-            end_datetime = (start_datetime + timedelta(days=days_diff)).replace(hour=18, minute=0)
-            text_lower = text_lower.replace(m.group(0), '')
-
-    return text_lower, start_datetime, end_datetime
-
-
-def parse_event_datetime(text: str, user_timezone: str):
-    user_tz = pytz.timezone(user_timezone)
-    text_lower = text.lower()
-    now = datetime.now(pytz.utc).astimezone(user_tz)
-
-    start_time_range = None
-    end_time_range = None
-
-    text_lower, start_datetime, end_datetime = parse_date_range(text_lower, now, user_tz)
-    # --- если диапазон дат не найден, ищем одиночную дату ---
-    if not start_datetime:
-        # старая логика с today/tomorrow/послезавтра, DD.MM, search_dates
-
-        # --- поиск диапазона времени "с 10 до 15" ---
-        time_range = re.search(
-            r'(?:с|от)\s*(\d{1,2}(?:[:.\s]\d{2})?)\s*(?:до|-)\s*(\d{1,2}(?:[:.\s]\d{2})?)',
-            text_lower
-        )
-        if time_range:
-            start_time_range = time_range.group(1)
-            end_time_range = time_range.group(2)
-            text_lower = text_lower.replace(time_range.group(0), '')
-
-        # --- ключевые слова "сегодня", "завтра", "послезавтра" ---
-        # "через N час/минут"
-        match = re.search(r'через\s+((\d+)\s*(часa|часов|час|минуты|минут)|полчаса)', text_lower)
-        if match:
-            fragment = match.group(0)
-            if 'полчаса' in fragment:
-                delta = timedelta(minutes=30)
-            elif 'час' in fragment and not re.search(r'\d+', fragment):
-                delta = timedelta(hours=1)
-            else:
-                amount = int(match.group(2))
-                unit = match.group(3)
-                if unit and 'мин' in unit:
-                    delta = timedelta(minutes=amount)
-                else:
-                    delta = timedelta(hours=amount)
-
-            start_datetime = now + delta
-            end_datetime = start_datetime + timedelta(hours=1)
-
-            # Убираем весь фрагмент, включая пробелы вокруг
-            event_title = re.sub(r'\s*' + re.escape(fragment) + r'\s*', ' ', text_lower, flags=re.IGNORECASE).strip()
-            if not event_title:
-                event_title = "Напоминание"
-
-            return event_title, start_datetime, end_datetime
-
-        elif "сегодня" in text_lower:
-            start_datetime = now.replace(second=0, microsecond=0)
-        elif "завтра" in text_lower:
-            start_datetime = (now + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
-            text_lower = text_lower.replace("завтра", "")
-        elif "послезавтра" in text_lower:
-            start_datetime = (now + timedelta(days=2)).replace(hour=9, minute=0, second=0, microsecond=0)
-            text_lower = text_lower.replace("послезавтра", "")
-        else:
-            # --- сначала пробуем регулярку DD.MM ---
-            date_match = re.search(r'\b(\d{1,2})[.](\d{1,2})\b', text_lower)
-            if date_match:
-                day = int(date_match.group(1))
-                month = int(date_match.group(2))
-                year = now.year
-                start_datetime = user_tz.localize(datetime(year, month, day))
-                text_lower = text_lower.replace(date_match.group(0), '')
-            else:
-                # --- обычный парсинг через search_dates ---
-                dates = search_dates(
-                    text_lower,
-                    languages=['ru'],
-                    settings={'PREFER_DATES_FROM': 'future', 'DATE_ORDER': 'DMY'}
-                )
-                if dates:
-                    start_datetime = dates[0][1]
-                    # если год не указан, берем текущий
-                    if start_datetime.year == 1900:
-                        start_datetime = start_datetime.replace(year=now.year)
-                    text_lower = text_lower.replace(dates[0][0], '')
-                else:
-                    start_datetime = None
+    return get_resolver().resolve(input_str)
 
 
-    parsed_time = parse_time_from_text(text_lower)
-    if parsed_time:
-        hour = parsed_time.hour
-        minute = parsed_time.minute
-        fragment = parsed_time.fragment
+# сколько событий из одного сообщения можно создать и сколько показать в подтверждении
+MAX_PENDING_EVENTS = 100
+PREVIEW_EVENTS = 15
+# больше событий в одно сообщение Telegram (4096 символов) всё равно не поместится
+SCHEDULE_EVENTS_LIMIT = 50
+# пул потоков мог дописать события после таймаута; у событий стабильные id, поэтому повтор безопасен
+TIMEOUT_TEXT = ("⏳ Google Calendar не ответил вовремя — события могли создаться позже.\n"
+                "Нажмите «Да» ещё раз: дубликатов не будет, напоминания поставятся.")
 
-        if start_datetime is None:
-            start_datetime = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        else:
-            start_datetime = start_datetime.replace(hour=hour, minute=minute)
-
-        # удаляем время из текста для заголовка
-        text_lower = text_lower.replace(fragment, '').strip()
-
-        # удаляем распознанное время из текста
-        # ищем все варианты: "в 7 вечера", "7 вечера", "7:00", "7.00", "7 00", "7 часов"
-        time_patterns = [
-            r'\bв\s*\d{1,2}\s*(?:утра|вечера)?\b',
-            r'\b\d{1,2}\s*(?:утра|вечера)\b',
-            r'\b\d{1,2}[:.]\d{2}\b',
-            r'\b\d{1,2}\s\d{2}\b',
-            r'\b\d{1,2}\s*час(?:ов|а)?\b'
-        ]
-
-        for p in time_patterns:
-            text_lower = re.sub(p, '', text_lower, flags=re.IGNORECASE)
-
-        # убираем лишние пробелы
-        text_lower = re.sub(r'\s+', ' ', text_lower).strip()
-
-    # --- если дата указана, но без времени ---
-    if start_datetime and start_datetime.hour == 0 and start_datetime.minute == 0 and not start_time_range:
-        start_datetime = start_datetime.replace(hour=9, minute=0)
-
-    # --- проверка, удалось ли распознать дату ---
-    if start_datetime is None:
-        raise ValueError("Дата и время не распознаны, уточните, пожалуйста")
-
-    # --- применяем таймзону ---
-    if start_datetime.tzinfo is None:
-        start_datetime = user_tz.localize(start_datetime)
-    else:
-        start_datetime = start_datetime.astimezone(user_tz)
-
-    # --- диапазон времени ---
-    if start_time_range and end_time_range:
-        def fmt(s):
-            parts = [int(x) for x in re.split(r'[:.\s]', s) if x.strip()]
-            return parts[0], parts[1] if len(parts) > 1 else 0
-
-        h1, m1 = fmt(start_time_range)
-        h2, m2 = fmt(end_time_range)
-        start_datetime = start_datetime.replace(hour=h1, minute=m1)
-        end_datetime = start_datetime.replace(hour=h2, minute=m2)
-
-        if start_datetime.tzinfo is None:
-            start_datetime = user_tz.localize(start_datetime)
-        if end_datetime.tzinfo is None:
-            end_datetime = user_tz.localize(end_datetime)
-    else:
-        # добавляем +1 час только если end_datetime ещё не задан
-        if not end_datetime:
-            end_datetime = start_datetime + timedelta(hours=1)
-            if end_datetime.tzinfo is None:
-                end_datetime = user_tz.localize(end_datetime)
-
-    # --- заголовок события: остаток текста ---
-    event_title = text_lower.strip() or "Напоминание"
-
-    return event_title, start_datetime, end_datetime
-
-
-def _iso_to_dt(s):
-    if not s:
-        return None
-    try:
-        return datetime.fromisoformat(s)
-    except Exception:
-        return None
+
+def _events_from_result(llm_result: ParseResult) -> list:
+    """События из поля events ответа парсера; неполные (без названия или начала) пропускаются"""
+    events = []
+    for item in llm_result.events[:MAX_PENDING_EVENTS]:
+        if not item.title or item.start is None:
+            continue
+        events.append({
+            'title': item.title,
+            'start': item.start,
+            'end': item.end or item.start + timedelta(hours=1),
+            'location': item.location,
+            'description': item.description,
+        })
+    return events
+
+
+def _event_line(event: dict) -> str:
+    return f"📅 {event['start'].strftime('%d.%m %H:%M')} - {event['end'].strftime('%H:%M')} {event['title']}"
 
 
 # ---------------- КЛАСС БОТА ----------------
 class TelegramCalendarBot:
-    def __init__(self):
+    def __init__(self, shard: int = 0, shards: int = 1):
+        """
+        :param shard: номер процесса-обработчика при шардировании (см. bot/sharding.py)
+        :param shards: число процессов; напоминания делятся между ними по chat_id
+        """
         self.token = os.getenv('TELEGRAM_BOT_TOKEN')
         if not self.token:
             raise ValueError("TELEGRAM_BOT_TOKEN не найден")
 
-        self.calendar_manager = GoogleCalendarManager()
+        self.calendar_manager = AsyncGoogleCalendarManager()
         self.user_manager = UserManager()
+        self.parse_pipeline = ParsePipeline()
+        self.reminder_scheduler = ReminderScheduler(ReminderStore(shard=shard, shards=shards))
+        # состояние диалогов переживает перезапуск (CONVERSATIONS_DB)
+        self.persistence = ConversationPersistence(shard=shard, shards=shards)
+        self._expire_task = None
+        # user_id -> задача фонового создания календаря
+        self._provisioning = {}
 
     @staticmethod
     async def handle_email_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -305,7 +106,7 @@ class TelegramCalendarBot:
 
     async def handle_calendar_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = str(update.effective_user.id)
-        user_data = self.user_manager.get_user(user_id) or {}
+        user_data = await self.user_manager.get_user(user_id) or {}
 
         calendar_id = user_data.get('calendar_id')
         timezone = user_data.get('timezone', 'UTC')
@@ -327,7 +128,7 @@ class TelegramCalendarBot:
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
         user_id = str(update.effective_user.id)
-        user_data = self.user_manager.get_user(user_id)
+        user_data = await self.user_manager.get_user(user_id)
 
         if not user_data:
             await update.message.reply_text(
@@ -367,41 +168,56 @@ class TelegramCalendarBot:
             if not pending:
                 await query.edit_message_text("❌ Нет события для подтверждения")
                 return
-            user_data = self.user_manager.get_user(user_id)
-
-            if not user_data.get('calendar_id'):
-                calendar_id = self.calendar_manager.create_user_calendar(user_data['email'],user_data['timezone'])
-                self.user_manager.ensure_calendar_id(user_id, calendar_id)
-                user_data['calendar_id'] = calendar_id
+            # календарь мог ещё создаваться в фоне после выбора часового пояса
+            await self._wait_provisioning(user_id)
+            user_data = await self.user_manager.get_user(user_id)
 
             if pending['end'] is None:
                 pending['end'] = pending['start'] + timedelta(hours=1)
 
             print(f"Пользователь {user_id} создал событие: {pending}")
 
-            event_link = self.calendar_manager.create_event(
-                title=pending['title'],
-                start=pending['start'],
-                end=pending['end'],
-                timezone=user_data['timezone'],
-                user_calendar_id=user_data['calendar_id'],
-                location=pending.get('location'),
-                description=pending.get('description')
-            )
+            existed = False
+            if user_data.get('calendar_id'):
+                # тот же путь, что и для нескольких событий: стабильный id и отметка «уже было»
+                result, = await self.calendar_manager.create_events(
+                    user_data['calendar_id'], [pending], timezone=user_data['timezone']
+                )
+                if result['error'] == 'timeout':
+                    # событие оставляем: повторное «Да» не создаст дубликат и поставит напоминание
+                    await query.edit_message_text(TIMEOUT_TEXT, reply_markup=query.message.reply_markup)
+                    return
+                event_link, existed = result['link'], result['existed']
+            else:
+                # календаря нет: создаём его вместе с первым событием (доступ и событие — одним batch)
+                calendar_id, event_link = await self.calendar_manager.provision_user_calendar(
+                    user_data['email'], user_data['timezone'],
+                    first_event={
+                        'title': pending['title'],
+                        'start': pending['start'],
+                        'end': pending['end'],
+                        'location': pending.get('location'),
+                        'description': pending.get('description'),
+                        'timezone': user_data['timezone'],
+                    }
+                )
+                if calendar_id:
+                    await self.user_manager.ensure_calendar_id(user_id, calendar_id)
 
             if event_link:
                 reminder_datetime = pending['start'] - timedelta(minutes=user_data['reminder_minutes'])
                 await self.schedule_reminder(
                     chat_id=query.message.chat.id,
+                    user_id=query.from_user.id,
                     event_title=pending['title'],
                     event_datetime=pending['start'],
                     reminder_datetime=reminder_datetime,
-                    context=context,
                     location=pending.get('location'),
                     description=pending.get('description')
                 )
                 await query.edit_message_text(
-                    f"✅ Событие создано!\n"
+                    ("ℹ️ Событие уже есть в календаре\n" if existed else "✅ Событие создано!\n") +
+                    f"📅 {pending['title']}\n"
                     f"📅 {pending['title']}\n"
                     f"🕐 {pending['start'].strftime('%d.%m.%Y %H:%M')}"
                     + (f"\n📍 {pending['location']}" if pending.get('location') else "")
@@ -412,16 +228,71 @@ class TelegramCalendarBot:
 
             context.user_data.pop('pending_event', None)
 
+        elif query.data == 'confirm_events':
+            pending_events = context.user_data.get('pending_events')
+            if not pending_events:
+                await query.edit_message_text("❌ Нет событий для подтверждения")
+                return
+            await self._wait_provisioning(user_id)
+            user_data = await self.user_manager.get_user(user_id)
+
+            calendar_id = user_data.get('calendar_id')
+            if not calendar_id:
+                calendar_id = await self.calendar_manager.create_user_calendar(user_data['email'], user_data['timezone'])
+                if calendar_id:
+                    await self.user_manager.ensure_calendar_id(user_id, calendar_id)
+            if not calendar_id:
+                await query.edit_message_text("❌ Ошибка при создании календаря")
+                return
+
+            # все события — одним-двумя batch-запросами, результат по каждому
+            results = await self.calendar_manager.create_events(
+                calendar_id, pending_events, timezone=user_data['timezone']
+            )
+            if any(result['error'] == 'timeout' for result in results):
+                # события оставляем: повторное «Да» не создаст дубликаты и поставит напоминания
+                await query.edit_message_text(TIMEOUT_TEXT, reply_markup=query.message.reply_markup)
+                return
+            failed = []
+            existed = 0
+            for event, result in zip(pending_events, results):
+                if not result['link']:
+                    failed.append(event)
+                    continue
+                existed += result['existed']
+                # напоминание о событии, которое уже было, повторно не ставится (см. ReminderStore.add)
+                await self.schedule_reminder(
+                    chat_id=query.message.chat.id,
+                    user_id=query.from_user.id,
+                    event_title=event['title'],
+                    event_datetime=event['start'],
+                    reminder_datetime=event['start'] - timedelta(minutes=user_data['reminder_minutes']),
+                    location=event.get('location'),
+                    description=event.get('description')
+                )
+
+            reply = f"✅ Создано событий: {len(pending_events) - len(failed) - existed} из {len(pending_events)}"
+            if existed:
+                reply += f"\nℹ️ Уже были в календаре: {existed}"
+            if failed:
+                reply += "\n\n❌ Не удалось создать:\n" + "\n".join(_event_line(e) for e in failed[:PREVIEW_EVENTS])
+                if len(failed) > PREVIEW_EVENTS:
+                    reply += f"\n… и ещё {len(failed) - PREVIEW_EVENTS}"
+            await query.edit_message_text(reply)
+
+            context.user_data.pop('pending_events', None)
+
         elif query.data == 'cancel_event':
             await query.edit_message_text("❌ Создание события отменено")
             context.user_data.pop('pending_event', None)
+            context.user_data.pop('pending_events', None)
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.info(f"Получено сообщение от {update.effective_user.id}: {update.message.text}")
         user_id = str(update.effective_user.id)
         text = update.message.text
 
-        user_data = self.user_manager.get_user(user_id)
+        user_data = await self.user_manager.get_user(user_id)
 
         # Проверяем, ожидаем ли мы какую-то информацию от пользователя
         if 'waiting_for' in context.user_data:
@@ -450,85 +321,87 @@ class TelegramCalendarBot:
             await update.message.reply_text("За сколько минут до события присылать напоминание?")
             return
 
-        # === НОВОЕ: сначала пробуем rule-based парсер ===
-        # try:
-        #     title, start_dt, end_dt = parse_event_datetime(text, user_data['timezone'])
-        #     # parser_success = True
-        #     parser_success = False
-        # except ValueError:
-        #     parser_success = False
-        #
-        #     # === Если парсер не справился, вызываем LLM ===
-        # if not parser_success:
-
         # Если ждём уточняющий ответ от пользователя (awaiting_clarify) — обработать его первым
+        previous = None
         if context.user_data.get('awaiting_clarify'):
             clarify = context.user_data.pop('awaiting_clarify')
-            combined_text = (
-                f"{clarify.get('orig_text', '')}\n\n"
-                f"Предыдущее частичное распознавание: {json.dumps(clarify.get('llm_json', {}), ensure_ascii=False)}\n\n"
-                f"Уточнение ({clarify.get('field')}): {text}"
-            )
-            input_text_for_llm = combined_text
+            # исходный текст + уточнение и только заполненные поля прошлого разбора
+            input_text_for_llm = f"{clarify.get('orig_text', '')}\nУточнение ({clarify.get('field')}): {text}"
+            previous = compact_previous(clarify.get('llm_json', {}))
         else:
             input_text_for_llm = text
 
+        # пока LLM дописывает ответ, по раннему intent уже идёт подготовительная работа
+        speculative = {}
         try:
-            llm_result = await parse_user_message(input_text_for_llm, user_data['timezone'])
+            # сначала rule-based парсер, LLM — только если он не уверен;
+            # уточнения всегда идут в LLM вместе с предыдущим распознаванием
+            llm_result = await self.parse_pipeline.parse(
+                input_text_for_llm, user_data['timezone'], use_fast_path=previous is None, previous=previous,
+                on_intent=lambda early_intent: self._speculate(early_intent, user_data, speculative)
+            )
         except Exception as e:
+            self._settle_speculation(speculative, None)
             logger.exception("Ошибка при вызове LLM")
             await update.message.reply_text("Ошибка при распознавании запроса (LLM).")
             return
+        self._settle_speculation(speculative, llm_result.intent)
 
-        logger.info("LLM intent=%s", llm_result.get('intent'))
+        logger.info("LLM intent=%s", llm_result.intent)
 
-        intent = llm_result.get("intent")
+        intent = llm_result.intent
 
         if intent == "query_schedule":
             # получение расписания
-            time_min = _iso_to_dt(llm_result['time_min'])
-            time_max = _iso_to_dt(llm_result['time_max'])
+            time_min = llm_result.time_min
+            time_max = llm_result.time_max
 
             if not time_min or not time_max:
                 await update.message.reply_text("Пожалуйста, уточните дату для просмотра расписания:")
                 context.user_data['awaiting_clarify'] = {
                     "field": "date",
-                    "llm_json": llm_result,
+                    "llm_json": llm_result.to_dict(),
                     "orig_text": text
                 }
                 return
 
-            events = self.calendar_manager.get_events(
+            events = await self.calendar_manager.get_events(
                 user_calendar_id=user_data.get('calendar_id'),
                 time_min=time_min,
-                time_max=time_max
+                time_max=time_max,
+                limit=SCHEDULE_EVENTS_LIMIT
             )
             # Можно отдать юзеру красивый текстовый список
             schedule_text = "\n".join([
-                f"📌 {e['title']} — {e['start'].strftime('%d.%m %H:%M')} - {e['end'].strftime('%H:%M')}"
+                f"📌 {e.title} — {e.start.strftime('%d.%m %H:%M')} - {e.end.strftime('%H:%M')}"
                 for e in events
             ]) or "Нет событий в выбранный период"
             await update.message.reply_text(schedule_text)
 
         elif intent == "find_free_time":
-            time_min = _iso_to_dt(llm_result['time_min'])
-            time_max = _iso_to_dt(llm_result['time_max'])
+            time_min = llm_result.time_min
+            time_max = llm_result.time_max
 
             if not time_min or not time_max:
                 await update.message.reply_text("Пожалуйста, уточните дату для просмотра расписания:")
                 context.user_data['awaiting_clarify'] = {
                     "field": "date",
-                    "llm_json": llm_result,
+                    "llm_json": llm_result.to_dict(),
                     "orig_text": text
                 }
                 return
 
-            # Получаем слоты по 1 часу с пометкой free
-            slots = self.calendar_manager.get_free_slots(
+            # Свободные окна и занятые интервалы периода
+            slots = await self.calendar_manager.get_free_slots(
                 user_calendar_id=user_data.get('calendar_id'),
                 time_min=time_min,
-                time_max=time_max
+                time_max=time_max,
+                timezone=user_data['timezone']
             )
+            if slots is None:
+                # ошибка или таймаут Google — не выдаём это за «нет слотов»
+                await update.message.reply_text("❌ Ошибка при получении свободного времени")
+                return
             # Формируем текст с отметкой свободен/занят
             if slots:
                 slots_text = "\n".join([
@@ -540,18 +413,35 @@ class TelegramCalendarBot:
             await update.message.reply_text(slots_text)
 
         elif intent == "create_event":
-            start_dt = _iso_to_dt(llm_result.get('start'))
-            end_dt = _iso_to_dt(llm_result.get('end'))
-            title = llm_result['title']
-            location = llm_result.get('location')
-            description = llm_result.get('description')
+            events = _events_from_result(llm_result)
+            if len(events) > 1:
+                # несколько событий (расписание, повторяющиеся занятия) — подтверждаются все сразу
+                context.user_data['pending_events'] = events
+                context.user_data.pop('pending_event', None)
+                confirm_text = f"Создать {len(events)} событий?\n\n" + "\n".join(
+                    _event_line(e) for e in events[:PREVIEW_EVENTS]
+                )
+                if len(events) > PREVIEW_EVENTS:
+                    confirm_text += f"\n… и ещё {len(events) - PREVIEW_EVENTS}"
+                keyboard = [
+                    [InlineKeyboardButton("✅ Да, все", callback_data='confirm_events')],
+                    [InlineKeyboardButton("❌ Нет", callback_data='cancel_event')]
+                ]
+                await update.message.reply_text(confirm_text, reply_markup=InlineKeyboardMarkup(keyboard))
+                return
+
+            start_dt = llm_result.start
+            end_dt = llm_result.end
+            title = llm_result.title
+            location = llm_result.location
+            description = llm_result.description
 
             if title is None:
                 # спросить название
                 await update.message.reply_text("Пожалуйста, уточните название события:")
                 context.user_data['awaiting_clarify'] = {
                     "field": "title",
-                    "llm_json": llm_result,
+                    "llm_json": llm_result.to_dict(),
                     "orig_text": text
                 }
                 return
@@ -560,7 +450,7 @@ class TelegramCalendarBot:
                 await update.message.reply_text("Пожалуйста, уточните дату и/или время события:")
                 context.user_data['awaiting_clarify'] = {
                     "field": "datetime",
-                    "llm_json": llm_result,
+                    "llm_json": llm_result.to_dict(),
                     "orig_text": text
                 }
                 return
@@ -601,7 +491,7 @@ class TelegramCalendarBot:
     async def handle_user_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
         user_id = str(update.effective_user.id)
         waiting_for = context.user_data.get('waiting_for')
-        user_data = self.user_manager.get_user(user_id) or {}
+        user_data = await self.user_manager.get_user(user_id) or {}
 
         # --- обработка ввода даты для /schedule ---
         if waiting_for == 'schedule_date':
@@ -613,18 +503,19 @@ class TelegramCalendarBot:
                 day_end = day_start + timedelta(days=1)
 
                 # получаем события из календаря
-                events = self.calendar_manager.get_events(
+                events = await self.calendar_manager.get_events(
                     user_calendar_id=user_data.get('calendar_id'),
                     time_min=day_start,
-                    time_max=day_end
+                    time_max=day_end,
+                    limit=SCHEDULE_EVENTS_LIMIT
                 )
 
                 if events:
                     msg = "📅 События на этот день:\n"
                     for e in events:
-                        start_time = e['start'].strftime("%H:%M")
-                        end_time = e['end'].strftime("%H:%M") if e.get('end') else ""
-                        msg += f"- {e['title']} ⏰ {start_time}"
+                        start_time = e.start.strftime("%H:%M")
+                        end_time = e.end.strftime("%H:%M") if e.end else ""
+                        msg += f"- {e.title} ⏰ {start_time}"
                         if end_time:
                             msg += f" — {end_time}"
                         msg += "\n"
@@ -642,12 +533,12 @@ class TelegramCalendarBot:
 
         if waiting_for == 'email':
             if '@' in text and '.' in text:
-                user_data = self.user_manager.get_user(user_id) or {
+                user_data = await self.user_manager.get_user(user_id) or {
                     'timezone': 'Europe/Moscow',
                     'reminder_minutes': 10
                 }
                 user_data['email'] = text.strip()
-                self.user_manager.save_user(user_id, user_data)
+                await self.user_manager.save_user(user_id, user_data)
                 await update.message.reply_text(
                     f"✅ Email сохранен: {text}\n\n"
                     f"Теперь укажите ваш часовой пояс.\n"
@@ -660,25 +551,21 @@ class TelegramCalendarBot:
                 await update.message.reply_text("❌ Некорректный email, попробуйте снова:")
 
         elif waiting_for == 'timezone':
-            tz = parse_timezone(text)
+            # геокодер может ходить в сеть — не блокируем event loop
+            tz = await asyncio.to_thread(parse_timezone, text)
             if tz:
-                user_data = self.user_manager.get_user(user_id)
+                user_data = await self.user_manager.get_user(user_id)
                 user_data['timezone'] = tz
+                await self.user_manager.save_user(user_id, user_data)
 
+                # календарь привязан к пользователю Telegram: повторно используем только его собственный.
+                # Email, введённый пользователем, не подтверждён — искать по нему чужой календарь нельзя
                 if not user_data.get('calendar_id'):
-                    # Пытаемся получить существующий календарь
-                    existing_calendar_id = self.calendar_manager.get_user_calendar(user_data['email'])
-                    if existing_calendar_id:
-                        calendar_id = existing_calendar_id
-                    else:
-                        # Если нет — создаем новый
-                        calendar_id = self.calendar_manager.create_user_calendar(
-                            user_email=user_data['email'],
-                            user_timezone=tz,
-                            calendar_summary=f"{update.effective_user.first_name} Календарь"
-                        )
-                    user_data['calendar_id'] = calendar_id
-                self.user_manager.save_user(user_id, user_data)
+                    # создаём календарь в фоне, пока пользователь отвечает на следующий вопрос
+                    self._start_provisioning(
+                        user_id, user_data['email'], tz,
+                        calendar_summary=f"{update.effective_user.first_name} Календарь"
+                    )
 
                 await update.message.reply_text(
                     f"✅ Часовой пояс сохранен: {tz}\n\n"
@@ -700,9 +587,9 @@ class TelegramCalendarBot:
             try:
                 minutes = int(text.strip())
                 if 1 <= minutes <= 1440:  # от 1 минуты до 24 часов
-                    user_data = self.user_manager.get_user(user_id)
+                    user_data = await self.user_manager.get_user(user_id)
                     user_data['reminder_minutes'] = minutes
-                    self.user_manager.save_user(user_id, user_data)
+                    await self.user_manager.save_user(user_id, user_data)
 
                     await update.message.reply_text(
                         f"✅ Настройка завершена!\n\n"
@@ -717,32 +604,116 @@ class TelegramCalendarBot:
             except ValueError:
                 await update.message.reply_text("❌ Укажите число (количество минут):")
 
-    @staticmethod
-    async def schedule_reminder(chat_id: int, event_title: str, event_datetime: datetime, reminder_datetime: datetime,
-                                context, location: str = None, description: str = None):
+    async def schedule_reminder(self, chat_id: int, user_id: int, event_title: str, event_datetime: datetime,
+                                reminder_datetime: datetime, location: str = None, description: str = None):
         now = datetime.now(reminder_datetime.tzinfo)
         if reminder_datetime <= now:
             return
-        delay = (reminder_datetime - now).total_seconds()
-
-        async def send_reminder():
-            await asyncio.sleep(delay)
-            message = (
-                f"⏰ Напоминание!\n"
-                f"📅 {event_title}\n"
-                f"🕐 {event_datetime.strftime('%d.%m.%Y %H:%M')}"
-            )
-            if location:
-                message += f"\n📍 {location}"
-            if description:
-                message += f"\n📝 {description}"
 
-            await context.bot.send_message(chat_id=chat_id, text=message)
+        message = (
+            f"⏰ Напоминание!\n"
+            f"📅 {event_title}\n"
+            f"🕐 {event_datetime.strftime('%d.%m.%Y %H:%M')}"
+        )
+        if location:
+            message += f"\n📍 {location}"
+        if description:
+            message += f"\n📝 {description}"
 
-        asyncio.create_task(send_reminder())
+        self.reminder_scheduler.schedule(chat_id, user_id, reminder_datetime, event_datetime, message)
 
-    def run(self):
-        app = Application.builder().token(self.token).build()
+    def _start_provisioning(self, user_id: str, email: str, timezone: str, calendar_summary: str):
+        """Создаёт календарь пользователя в фоне; к первому событию он уже будет готов"""
+        if user_id in self._provisioning:
+            return
+
+        async def provision():
+            try:
+                calendar_id = await self.calendar_manager.create_user_calendar(
+                    user_email=email,
+                    user_timezone=timezone,
+                    calendar_summary=calendar_summary
+                )
+                if calendar_id:
+                    await self.user_manager.ensure_calendar_id(user_id, calendar_id)
+            except Exception as e:
+                logger.error(f"Ошибка фонового создания календаря для {user_id}: {e}")
+            finally:
+                self._provisioning.pop(user_id, None)
+
+        self._provisioning[user_id] = asyncio.create_task(provision())
+
+    async def _wait_provisioning(self, user_id: str):
+        task = self._provisioning.get(user_id)
+        if task:
+            await asyncio.shield(task)
+
+    def _speculate(self, intent: str, user_data: dict, speculative: dict):
+        """Запускает работу, которая понадобится для intent, ещё до конца ответа LLM"""
+        calendar_id = user_data.get('calendar_id')
+        if intent == 'query_schedule' and calendar_id:
+            # события будут читаться из локальной копии — синхронизируем её заранее
+            work = self.calendar_manager.prefetch_events(calendar_id)
+        elif intent in ('create_event', 'find_free_time'):
+            # токен сервисного аккаунта и клиент API будут готовы к основному запросу
+            work = self.calendar_manager.warm_up()
+        else:
+            return
+
+        async def run():
+            try:
+                await work
+            except Exception as e:
+                # подготовка необязательна — основной запрос сделает то же самое сам
+                logger.warning(f"Подготовка для раннего intent {intent} не удалась: {e}")
+
+        speculative[intent] = asyncio.create_task(run())
+        logger.debug(f"Ранний intent {intent}: подготовка запущена")
+
+    @staticmethod
+    def _settle_speculation(speculative: dict, final_intent):
+        """Отменяет подготовку, если окончательный intent оказался другим"""
+        for intent, task in speculative.items():
+            if intent != final_intent and not task.done():
+                task.cancel()
+                logger.info(f"Ранний intent {intent} не подтвердился ({final_intent}), подготовка отменена")
+
+    async def _expire_conversations(self, app: Application):
+        """Выбрасывает из памяти и хранилища диалоги, брошенные дольше CONVERSATION_TTL"""
+        while True:
+            await asyncio.sleep(60)
+            expired = self.persistence.expired_users()
+            for user_id in expired:
+                app.drop_user_data(user_id)
+            if expired:
+                logger.info(f"Удалено брошенных диалогов: {len(expired)}")
+
+    async def _post_init(self, app: Application):
+        self.reminder_scheduler.start(app.bot)
+        self._expire_task = asyncio.create_task(self._expire_conversations(app))
+
+    async def _post_shutdown(self, app: Application):
+        if self._expire_task:
+            self._expire_task.cancel()
+        await self.reminder_scheduler.stop()
+        self.calendar_manager.close()
+        await close_client()
+
+    def build_application(self) -> Application:
+        # апдейты одного чата — по очереди, разных чатов — параллельно (не больше BOT_CONCURRENT_UPDATES)
+        update_processor = PerChatUpdateProcessor(
+            max_concurrent_handlers=int(os.getenv('BOT_CONCURRENT_UPDATES', '8')),
+            max_pending_updates=int(os.getenv('BOT_MAX_PENDING_UPDATES', '256')),
+        )
+        app = (
+            Application.builder()
+            .token(self.token)
+            .concurrent_updates(update_processor)
+            .persistence(self.persistence)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
         app.add_handler(CommandHandler("start", self.start_command))
         app.add_handler(CommandHandler('email', self.handle_email_command))
         app.add_handler(CommandHandler('timezone', self.handle_timezone_command))
@@ -751,8 +722,12 @@ class TelegramCalendarBot:
         app.add_handler(CommandHandler("calendar", self.handle_calendar_command))
         app.add_handler(CallbackQueryHandler(self.button_callback))
         app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
-        logger.info("Бот запущен!")
-        app.run_polling(allowed_updates=Update.ALL_TYPES)
+        return app
+
+    def run(self):
+        app = self.build_application()
+        logger.info(f"Бот запущен! Режим: {os.getenv('BOT_MODE', 'polling')}")
+        serve(app)
 
 # ---------------- ЗАПУСК ----------------
 if __name__ == '__main__':
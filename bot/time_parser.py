@@ -1,8 +1,109 @@
 import re
 from collections import namedtuple
+from datetime import datetime, date, timedelta
+
+import pytz
+from dateparser.search import search_dates
 
 ParsedTime = namedtuple("ParsedTime", ["hour", "minute", "fragment"])
 
+MONTHS = {
+    'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5,
+    'июня': 6, 'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10,
+    'ноября': 11, 'декабря': 12
+}
+# основы дней недели: «пятница», «пятницу», «пятницы» — один и тот же день
+WEEKDAY_STEMS = {
+    'понедельник': 0, 'вторник': 1, 'сред': 2, 'четверг': 3,
+    'пятниц': 4, 'суббот': 5, 'воскресень': 6
+}
+DAY_WORDS = {'сегодня': 0, 'завтра': 1, 'послезавтра': 2}
+
+_MONTH = '|'.join(MONTHS)
+_WEEKDAY = '|'.join(WEEKDAY_STEMS)
+_CLOCK = r'\d{1,2}(?:[:.]\d{2})?'
+
+_DATE_RANGE = (
+    rf'с\s+(?P<dr_d1>\d{{1,2}})(?:\.(?P<dr_m1>\d{{1,2}}))?(?:\s*(?P<dr_mt1>{_MONTH}))?(?:\s*(?P<dr_y1>\d{{4}}))?'
+    rf'\s*(?P<dr_sep>по|-)\s*'
+    rf'(?P<dr_d2>\d{{1,2}})(?:\.(?P<dr_m2>\d{{1,2}}))?(?:\s*(?P<dr_mt2>{_MONTH}))?(?:\s*(?P<dr_y2>\d{{4}}))?\b'
+)
+_WEEKDAY_RANGE = rf'с\s+(?P<wr1>{_WEEKDAY})\w*\s*(?:до|по)\s*(?P<wr2>{_WEEKDAY})\w*'
+_TIME_RANGE = r'(?:с|от)\s*(?P<tr1>\d{1,2}(?:[:.\s]\d{2})?)\s*(?:до|-)\s*(?P<tr2>\d{1,2}(?:[:.\s]\d{2})?)\b'
+_RELATIVE = r'через\s+(?:(?P<rel_n>\d+)\s*)?(?P<rel_unit>полчаса|час\w*|минут\w*|дн\w*|день|недел\w*)'
+_DAY_WORD = r'(?P<day_word>послезавтра|завтра|сегодня)\b'
+_DMY = r'(?P<dmy_d>\d{1,2})\.(?P<dmy_m>\d{1,2})(?:\.(?P<dmy_y>\d{4}|\d{2}))?(?![\d:])'
+_DAY_MONTH = rf'(?P<dm_d>\d{{1,2}})\s+(?P<dm_m>{_MONTH})(?:\s+(?P<dm_y>\d{{4}}))?'
+_WEEKDAY_TOKEN = rf'(?P<weekday>{_WEEKDAY})\w*'
+_TIME = (
+    r'(?P<t_h>\d{1,2})(?:[:.\s](?P<t_m>\d{2}))?(?!\d)'
+    r'(?:\s*(?P<t_mer>утра|вечера|дня|ночи|час(?:ов|а)?)\b)?'
+)
+
+# Одна грамматика на всё сообщение: альтернативы в порядке приоритета,
+# необязательный предлог перед токеном («в 15», «в пятницу», «к 10») вырезается вместе с ним.
+TOKEN = re.compile(
+    rf'(?<!\w)(?P<prep>(?:в|во|к|на)\s+)?(?:'
+    rf'(?P<date_range>{_DATE_RANGE})|(?P<weekday_range>{_WEEKDAY_RANGE})|(?P<time_range>{_TIME_RANGE})'
+    rf'|(?P<relative>{_RELATIVE})|{_DAY_WORD}|(?P<dmy>{_DMY})|(?P<day_month>{_DAY_MONTH})'
+    rf'|(?P<weekday_token>{_WEEKDAY_TOKEN})|(?P<time>{_TIME}))'
+)
+DATE_RANGE = re.compile(rf'(?<!\w){_DATE_RANGE}')
+WEEKDAY_RANGE = re.compile(rf'(?<!\w){_WEEKDAY_RANGE}')
+TIME_RANGE = re.compile(rf'(?<!\w){_TIME_RANGE}')
+TIME_TOKEN = re.compile(rf'(?<!\w)(?:(?:в|к)\s+)?{_TIME}')
+CLOCK_SPLIT = re.compile(r'[:.\s]')
+SPACES = re.compile(r'\s+')
+TITLE_EDGES = ' ,.;:-—'
+
+
+def _weekday(stem: str) -> int:
+    return WEEKDAY_STEMS[stem]
+
+
+def _clock(value: str):
+    """'10', '10:30', '10.30', '10 30' -> (10, 30)"""
+    parts = [int(x) for x in CLOCK_SPLIT.split(value) if x]
+    hour, minute = parts[0], parts[1] if len(parts) > 1 else 0
+    if hour > 23 or minute > 59:
+        return None
+    return hour, minute
+
+
+def _time_of(match):
+    """(hour, minute, явное ли время) из токена времени или None"""
+    hour = int(match.group('t_h'))
+    minute = int(match.group('t_m')) if match.group('t_m') else 0
+    meridian = match.group('t_mer')
+    if meridian == 'вечера' and hour < 12:
+        hour += 12
+    elif meridian == 'дня' and hour <= 6:
+        hour += 12
+    if hour > 23 or minute > 59:
+        return None
+    # «17» без «в», минут и «утра/вечера» — может быть и не временем
+    explicit = bool(match.group('t_m') or meridian or match.group('prep'))
+    return hour, minute, explicit
+
+
+def _future_date(year, month: int, day: int, today: date):
+    """Дата без года — ближайшая будущая (как в правилах LLM)"""
+    try:
+        result = date(year or today.year, month, day)
+        if year is None and result < today:
+            result = result.replace(year=today.year + 1)
+    except ValueError:
+        return None
+    return result
+
+
+def _year(value):
+    if not value:
+        return None
+    year = int(value)
+    return year + 2000 if year < 100 else year
+
+
 def parse_time_from_text(text: str) -> ParsedTime | None:
     """
     Ищет время в тексте и возвращает (hour, minute, фрагмент для удаления)
@@ -14,20 +115,254 @@ def parse_time_from_text(text: str) -> ParsedTime | None:
       - в 8 утра / вечера
       - 20 часов
     """
-    patterns = [
-        r'\b(\d{1,2})[:.\s](\d{2})\b',  # 17:30, 17.30, 17 30
-        r'\b(\d{1,2})\b',  # просто 17
-        r'\b(\d{1,2})\s*(час|часа|часов|минут|минуты)?\b',  # 17 часов, 10 минут
-        r'\b(час|полчаса)\b'  # час, полчаса
-    ]
-    for p in patterns:
-        match = re.search(p, text)
+    weak = None
+    for match in TIME_TOKEN.finditer(text.lower()):
+        hour = int(match.group('t_h'))
+        minute = int(match.group('t_m')) if match.group('t_m') else 0
+        meridian = match.group('t_mer')
+        if meridian == 'вечера' and hour < 12:
+            hour += 12
+        elif meridian == 'дня' and hour <= 6:
+            hour += 12
+        if hour > 23 or minute > 59:
+            continue
+        parsed = ParsedTime(hour=hour, minute=minute, fragment=match.group(0))
+        if match.group('t_m') or meridian or match.group(0)[0] in 'вк':
+            return parsed
+        weak = weak or parsed
+    return weak
+
+
+def _date_range(match, now, user_tz):
+    """(start, end) для «с 1 по 5 сентября» или None, если это диапазон времени «с 10-12»"""
+    groups = match.groupdict()
+    has_month = groups['dr_m1'] or groups['dr_mt1'] or groups['dr_m2'] or groups['dr_mt2']
+    if groups['dr_sep'] == '-' and not has_month:
+        return None
+
+    def month_of(num, text, default):
+        if num:
+            return int(num)
+        return MONTHS.get(text, default)
+
+    start_month = month_of(groups['dr_m1'], groups['dr_mt1'], None)
+    end_month = month_of(groups['dr_m2'], groups['dr_mt2'], start_month or now.month)
+    start_month = start_month or end_month
+    start_year = int(groups['dr_y1']) if groups['dr_y1'] else (int(groups['dr_y2']) if groups['dr_y2'] else now.year)
+    end_year = int(groups['dr_y2']) if groups['dr_y2'] else start_year
+    try:
+        start = user_tz.localize(datetime(start_year, start_month, int(groups['dr_d1']), 9, 0))
+        end = user_tz.localize(datetime(end_year, end_month, int(groups['dr_d2']), 18, 0))
+    except ValueError:
+        return None
+    return start, end
+
+
+def _weekday_range(match, now):
+    start_weekday = _weekday(match.group('wr1'))
+    end_weekday = _weekday(match.group('wr2'))
+    days_ahead = (start_weekday - now.weekday() + 7) % 7
+    start = (now + timedelta(days=days_ahead)).replace(hour=9, minute=0, second=0, microsecond=0)
+    days_diff = (end_weekday - start_weekday + 7) % 7
+    end = (start + timedelta(days=days_diff)).replace(hour=18, minute=0)
+    return start, end
+
+
+def parse_date_range(text_lower, now, user_tz):
+    start_datetime = None
+    end_datetime = None
+
+    # --- диапазон дат: числа/текст/год ---
+    for match in DATE_RANGE.finditer(text_lower):
+        parsed = _date_range(match, now, user_tz)
+        if parsed:
+            start_datetime, end_datetime = parsed
+            text_lower = text_lower.replace(match.group(0), '')
+            break
+
+    # --- дни недели ---
+    if not start_datetime:
+        match = WEEKDAY_RANGE.search(text_lower)
         if match:
-            hour = int(match.group(1))
-            minute = int(match.group(2)) if len(match.groups()) > 1 and match.group(2) else 0
-            # учитываем утро/вечер
-            meridian_match = re.search(r'утра|вечера', text.lower())
-            if meridian_match and 'вечера' in meridian_match.group(0).lower() and hour < 12:
-                hour += 12
-            return ParsedTime(hour=hour, minute=minute, fragment=match.group(0))
-    return None
+            start_datetime, end_datetime = _weekday_range(match, now)
+            text_lower = text_lower.replace(match.group(0), '')
+
+    return text_lower, start_datetime, end_datetime
+
+
+def _title(text: str, text_lower: str, spans) -> str:
+    """Текст сообщения без распознанных фрагментов (в исходном регистре, если возможно)"""
+    source = text if len(text) == len(text_lower) else text_lower
+    parts = []
+    position = 0
+    for start, end in sorted(spans):
+        parts.append(source[position:start])
+        position = max(position, end)
+    parts.append(source[position:])
+    title = SPACES.sub(' ', ' '.join(parts)).strip(TITLE_EDGES)
+    return title or "Напоминание"
+
+
+def parse_event_datetime(text: str, user_timezone: str):
+    """
+    Разбирает дату и время события за один проход по тексту.
+    :return: (заголовок, начало, конец) — datetime в таймзоне пользователя
+    :raises ValueError: если дату и время распознать не удалось
+    """
+    user_tz = pytz.timezone(user_timezone)
+    text_lower = text.lower()
+    now = datetime.now(pytz.utc).astimezone(user_tz)
+    today = now.date()
+
+    day = None
+    day_word = None
+    date_range = None
+    time_range = None
+    clock = None
+    spans = []
+
+    for match in TOKEN.finditer(text_lower):
+        groups = match.groupdict()
+        span = match.span()
+
+        if groups['date_range']:
+            parsed = _date_range(match, now, user_tz)
+            if parsed is None:
+                # «с 10-12» без месяца — это время
+                start_clock = _clock(groups['dr_d1'])
+                end_clock = _clock(groups['dr_d2'])
+                if time_range is None and start_clock and end_clock:
+                    time_range = (start_clock, end_clock)
+                    spans.append(span)
+                continue
+            if date_range is None:
+                date_range = parsed
+                spans.append(span)
+
+        elif groups['weekday_range']:
+            if date_range is None:
+                date_range = _weekday_range(match, now)
+                spans.append(span)
+
+        elif groups['time_range']:
+            start_clock = _clock(groups['tr1'])
+            end_clock = _clock(groups['tr2'])
+            if time_range is None and start_clock and end_clock:
+                time_range = (start_clock, end_clock)
+                spans.append(span)
+
+        elif groups['relative']:
+            amount = int(groups['rel_n']) if groups['rel_n'] else 1
+            unit = groups['rel_unit']
+            if unit.startswith(('дн', 'день', 'недел')):
+                if day is None:
+                    day = today + timedelta(days=amount * (7 if unit.startswith('недел') else 1))
+                    spans.append(span)
+                continue
+            # «через N часов/минут» — момент от текущего времени, остальное не важно
+            if unit == 'полчаса':
+                delta = timedelta(minutes=30)
+            elif unit.startswith('мин'):
+                delta = timedelta(minutes=amount)
+            else:
+                delta = timedelta(hours=amount)
+            start_datetime = now + delta
+            return _title(text, text_lower, [span]), start_datetime, start_datetime + timedelta(hours=1)
+
+        elif groups['day_word']:
+            if day is None:
+                day_word = groups['day_word']
+                day = today + timedelta(days=DAY_WORDS[day_word])
+                spans.append(span)
+
+        elif groups['dmy']:
+            # «в 9.05» / «к 10.30» — время (формат «9.00» из правил LLM), а не 9 мая
+            as_time = (not groups['dmy_y'] and (groups['prep'] or '').strip() in ('в', 'к')
+                       and _clock(f"{groups['dmy_d']}:{groups['dmy_m']}") is not None)
+            parsed = None if as_time else _future_date(
+                _year(groups['dmy_y']), int(groups['dmy_m']), int(groups['dmy_d']), today
+            )
+            if parsed is None and not groups['dmy_y']:
+                # «15.30» — не дата, а время
+                parsed_clock = _clock(f"{groups['dmy_d']}:{groups['dmy_m']}")
+                if clock is None and parsed_clock:
+                    clock = parsed_clock
+                    spans.append(span)
+                continue
+            if day is None and parsed:
+                day = parsed
+                spans.append(span)
+
+        elif groups['day_month']:
+            parsed = _future_date(_year(groups['dm_y']), MONTHS[groups['dm_m']], int(groups['dm_d']), today)
+            if day is None and parsed:
+                day = parsed
+                spans.append(span)
+
+        elif groups['weekday_token']:
+            if day is None:
+                days_ahead = (_weekday(groups['weekday']) - today.weekday()) % 7 or 7
+                day = today + timedelta(days=days_ahead)
+                spans.append(span)
+
+        elif groups['time']:
+            parsed = _time_of(match)
+            if parsed is None:
+                continue
+            hour, minute, explicit = parsed
+            # голое число без «в/к», минут и «утра/часов» («2 молока», «5 км») временем не считаем:
+            # оно остаётся в заголовке, и цифры в заголовке снижают уверенность быстрого пути
+            if explicit and clock is None:
+                clock = (hour, minute)
+                spans.append(span)
+
+    # --- диапазон дат ---
+    if date_range:
+        start_datetime, end_datetime = date_range
+        if clock:
+            start_datetime = start_datetime.replace(hour=clock[0], minute=clock[1])
+        return _title(text, text_lower, spans), start_datetime, end_datetime
+
+    # --- ничего не нашли грамматикой — последний шанс: dateparser ---
+    if day is None and clock is None and time_range is None:
+        dates = search_dates(
+            text_lower,
+            languages=['ru'],
+            settings={'PREFER_DATES_FROM': 'future', 'DATE_ORDER': 'DMY'}
+        )
+        if not dates:
+            raise ValueError("Дата и время не распознаны, уточните, пожалуйста")
+        fragment, start_datetime = dates[0]
+        # если год не указан, берем текущий
+        if start_datetime.year == 1900:
+            start_datetime = start_datetime.replace(year=now.year)
+        if start_datetime.hour == 0 and start_datetime.minute == 0:
+            start_datetime = start_datetime.replace(hour=9, minute=0)
+        if start_datetime.tzinfo is None:
+            start_datetime = user_tz.localize(start_datetime)
+        else:
+            start_datetime = start_datetime.astimezone(user_tz)
+        position = text_lower.find(fragment)
+        title = _title(text, text_lower, [(position, position + len(fragment))] if position >= 0 else [])
+        return title, start_datetime, start_datetime + timedelta(hours=1)
+
+    base = day or today
+    if time_range:
+        (h1, m1), (h2, m2) = time_range
+        start_datetime = user_tz.localize(datetime(base.year, base.month, base.day, h1, m1))
+        end_datetime = user_tz.localize(datetime(base.year, base.month, base.day, h2, m2))
+        if end_datetime <= start_datetime:
+            # «с 22 до 2» — конец уже на следующий день
+            end_day = base + timedelta(days=1)
+            end_datetime = user_tz.localize(datetime(end_day.year, end_day.month, end_day.day, h2, m2))
+    else:
+        if clock:
+            start_datetime = user_tz.localize(datetime(base.year, base.month, base.day, *clock))
+        elif day_word == 'сегодня':
+            start_datetime = now.replace(second=0, microsecond=0)
+        else:
+            # дата указана, но без времени
+            start_datetime = user_tz.localize(datetime(base.year, base.month, base.day, 9, 0))
+        end_datetime = start_datetime + timedelta(hours=1)
+
+    return _title(text, text_lower, spans), start_datetime, end_datetime
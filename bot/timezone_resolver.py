@@ -0,0 +1,198 @@
+import os
+import re
+import time
+import logging
+import threading
+
+import pytz
+
+from bot.db import connect
+
+logger = logging.getLogger(__name__)
+
+# города и сокращения, которые пишут пользователи -> IANA
+CITY_ALIASES = {
+    # Россия
+    'москва': 'Europe/Moscow', 'мск': 'Europe/Moscow', 'msk': 'Europe/Moscow',
+    'санкт петербург': 'Europe/Moscow', 'петербург': 'Europe/Moscow', 'питер': 'Europe/Moscow',
+    'спб': 'Europe/Moscow', 'saint petersburg': 'Europe/Moscow', 'st petersburg': 'Europe/Moscow',
+    'казань': 'Europe/Moscow', 'kazan': 'Europe/Moscow',
+    'нижний новгород': 'Europe/Moscow', 'nizhny novgorod': 'Europe/Moscow',
+    'воронеж': 'Europe/Moscow', 'ростов на дону': 'Europe/Moscow', 'ростов': 'Europe/Moscow',
+    'краснодар': 'Europe/Moscow', 'сочи': 'Europe/Moscow', 'sochi': 'Europe/Moscow',
+    'калининград': 'Europe/Kaliningrad', 'kaliningrad': 'Europe/Kaliningrad',
+    'самара': 'Europe/Samara', 'samara': 'Europe/Samara',
+    'волгоград': 'Europe/Volgograd', 'volgograd': 'Europe/Volgograd',
+    'саратов': 'Europe/Saratov', 'ульяновск': 'Europe/Ulyanovsk', 'астрахань': 'Europe/Astrakhan',
+    'уфа': 'Asia/Yekaterinburg', 'ufa': 'Asia/Yekaterinburg',
+    'пермь': 'Asia/Yekaterinburg', 'perm': 'Asia/Yekaterinburg',
+    'екатеринбург': 'Asia/Yekaterinburg', 'екб': 'Asia/Yekaterinburg', 'yekaterinburg': 'Asia/Yekaterinburg',
+    'челябинск': 'Asia/Yekaterinburg', 'тюмень': 'Asia/Yekaterinburg',
+    'омск': 'Asia/Omsk', 'omsk': 'Asia/Omsk',
+    'новосибирск': 'Asia/Novosibirsk', 'нск': 'Asia/Novosibirsk', 'novosibirsk': 'Asia/Novosibirsk',
+    'барнаул': 'Asia/Barnaul', 'томск': 'Asia/Tomsk', 'новокузнецк': 'Asia/Novokuznetsk',
+    'красноярск': 'Asia/Krasnoyarsk', 'krasnoyarsk': 'Asia/Krasnoyarsk',
+    'иркутск': 'Asia/Irkutsk', 'irkutsk': 'Asia/Irkutsk',
+    'чита': 'Asia/Chita', 'якутск': 'Asia/Yakutsk', 'yakutsk': 'Asia/Yakutsk',
+    'владивосток': 'Asia/Vladivostok', 'vladivostok': 'Asia/Vladivostok',
+    'хабаровск': 'Asia/Vladivostok', 'khabarovsk': 'Asia/Vladivostok',
+    'южно сахалинск': 'Asia/Sakhalin', 'сахалин': 'Asia/Sakhalin',
+    'магадан': 'Asia/Magadan', 'magadan': 'Asia/Magadan',
+    'петропавловск камчатский': 'Asia/Kamchatka', 'камчатка': 'Asia/Kamchatka',
+    # СНГ
+    'минск': 'Europe/Minsk', 'киев': 'Europe/Kyiv', 'kyiv': 'Europe/Kyiv', 'kiev': 'Europe/Kyiv',
+    'кишинев': 'Europe/Chisinau', 'тбилиси': 'Asia/Tbilisi', 'ереван': 'Asia/Yerevan',
+    'баку': 'Asia/Baku', 'алматы': 'Asia/Almaty', 'алма ата': 'Asia/Almaty',
+    'астана': 'Asia/Almaty', 'astana': 'Asia/Almaty', 'ташкент': 'Asia/Tashkent',
+    'бишкек': 'Asia/Bishkek', 'душанбе': 'Asia/Dushanbe', 'ашхабад': 'Asia/Ashgabat',
+    # мир
+    'лондон': 'Europe/London', 'париж': 'Europe/Paris', 'берлин': 'Europe/Berlin',
+    'рим': 'Europe/Rome', 'мадрид': 'Europe/Madrid', 'лиссабон': 'Europe/Lisbon',
+    'амстердам': 'Europe/Amsterdam', 'прага': 'Europe/Prague', 'варшава': 'Europe/Warsaw',
+    'вена': 'Europe/Vienna', 'белград': 'Europe/Belgrade', 'будапешт': 'Europe/Budapest',
+    'хельсинки': 'Europe/Helsinki', 'рига': 'Europe/Riga', 'вильнюс': 'Europe/Vilnius',
+    'таллин': 'Europe/Tallinn', 'стамбул': 'Europe/Istanbul', 'анталья': 'Europe/Istanbul',
+    'antalya': 'Europe/Istanbul', 'тель авив': 'Asia/Jerusalem', 'tel aviv': 'Asia/Jerusalem',
+    'дубай': 'Asia/Dubai', 'бангкок': 'Asia/Bangkok', 'пхукет': 'Asia/Bangkok', 'phuket': 'Asia/Bangkok',
+    'паттайя': 'Asia/Bangkok', 'pattaya': 'Asia/Bangkok', 'бали': 'Asia/Makassar', 'bali': 'Asia/Makassar',
+    'денпасар': 'Asia/Makassar', 'сингапур': 'Asia/Singapore', 'токио': 'Asia/Tokyo',
+    'пекин': 'Asia/Shanghai', 'beijing': 'Asia/Shanghai', 'шанхай': 'Asia/Shanghai',
+    'гонконг': 'Asia/Hong_Kong', 'сеул': 'Asia/Seoul', 'дели': 'Asia/Kolkata', 'delhi': 'Asia/Kolkata',
+    'гоа': 'Asia/Kolkata', 'goa': 'Asia/Kolkata', 'нью йорк': 'America/New_York',
+    'лос анджелес': 'America/Los_Angeles', 'сан франциско': 'America/Los_Angeles',
+    'san francisco': 'America/Los_Angeles', 'чикаго': 'America/Chicago', 'торонто': 'America/Toronto',
+    'мехико': 'America/Mexico_City', 'буэнос айрес': 'America/Argentina/Buenos_Aires',
+    'utc': 'UTC', 'gmt': 'Etc/GMT',
+}
+
+UTC_OFFSET = re.compile(r'(?:utc|gmt)?\s*([+-]?\d{1,2})$')
+NORMALIZE_SEPARATORS = re.compile(r'[\s\-_.,]+')
+
+
+def normalize_place(text: str) -> str:
+    return NORMALIZE_SEPARATORS.sub(' ', text.lower().replace('ё', 'е')).strip()
+
+
+def _build_index() -> dict:
+    """Алиасы + названия из базы IANA: 'Europe/Moscow', 'moscow', 'new york', ..."""
+    index = {}
+    for tz in pytz.all_timezones:
+        index[tz.lower()] = tz
+        city = normalize_place(tz.rsplit('/', 1)[-1])
+        # для городов с одинаковым названием оставляем первую (каноническую) зону
+        index.setdefault(city, tz)
+    index.update(CITY_ALIASES)
+    return index
+
+
+class TimezoneResolver:
+    """
+    Определение таймзоны по вводу пользователя: смещение UTC, встроенный индекс
+    городов, затем геокодер с кэшем на диске. Без сети работает по индексу.
+    """
+
+    def __init__(self, cache_file: str = None, geocoder_timeout: float = None, cache_ttl: float = None):
+        self.cache_file = cache_file or os.getenv('GEOCODE_CACHE_DB', 'geocode_cache.db')
+        self.geocoder_timeout = geocoder_timeout or float(os.getenv('GEOCODER_TIMEOUT', '5'))
+        self.cache_ttl = cache_ttl or float(os.getenv('GEOCODE_CACHE_TTL', str(90 * 86400)))
+        self.index = _build_index()
+        self._timezones_lower = [(tz.lower(), tz) for tz in pytz.all_timezones]
+        self._finder = None
+        self._geolocator = None
+        self._lock = threading.Lock()
+        self._conn = connect(self.cache_file)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocode_cache (
+                    query TEXT PRIMARY KEY,
+                    timezone TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+
+    @property
+    def finder(self):
+        """Один TimezoneFinder на процесс: данные полигонов загружаются при первом обращении"""
+        if self._finder is None:
+            with self._lock:
+                if self._finder is None:
+                    from timezonefinder import TimezoneFinder
+                    self._finder = TimezoneFinder(in_memory=True)
+        return self._finder
+
+    @property
+    def geolocator(self):
+        if self._geolocator is None:
+            from geopy.geocoders import Nominatim
+            self._geolocator = Nominatim(user_agent="timezone_bot", timeout=self.geocoder_timeout)
+        return self._geolocator
+
+    def _cached(self, query: str):
+        """(найдено ли в кэше, таймзона или None)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT timezone, created_at FROM geocode_cache WHERE query = ?", (query,)
+            ).fetchone()
+        if row is None or time.time() - row['created_at'] > self.cache_ttl:
+            return False, None
+        return True, row['timezone']
+
+    def _remember(self, query: str, timezone):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache (query, timezone, created_at) VALUES (?, ?, ?)",
+                (query, timezone, time.time())
+            )
+
+    def _geocode(self, query: str):
+        found, timezone = self._cached(query)
+        if found:
+            return timezone
+        try:
+            location = self.geolocator.geocode(query)
+        except Exception as e:
+            # сетевую ошибку не кэшируем — в следующий раз геокодер может ответить
+            logger.warning(f"Геокодер недоступен для '{query}': {e}")
+            return None
+        timezone = None
+        if location:
+            timezone = self.finder.timezone_at(lng=location.longitude, lat=location.latitude)
+        self._remember(query, timezone)
+        return timezone
+
+    def resolve(self, input_str: str):
+        input_str = input_str.strip()
+        query = normalize_place(input_str)
+
+        # UTC смещение
+        match = UTC_OFFSET.match(input_str.lower())
+        if match:
+            offset_hours = int(match.group(1))
+            return f"Etc/GMT{-offset_hours:+d}"
+
+        # встроенный индекс городов и названий IANA
+        timezone = self.index.get(query) or self.index.get(input_str.lower())
+        if timezone:
+            return timezone
+
+        # геокодер (с кэшем на диске)
+        timezone = self._geocode(query)
+        if timezone:
+            return timezone
+
+        # Поиск по частичному совпадению
+        needle = query.replace(' ', '_')
+        for tz_lower, tz in self._timezones_lower:
+            if needle in tz_lower:
+                return tz
+        return None
+
+
+_resolver = None
+
+
+def get_resolver() -> TimezoneResolver:
+    global _resolver
+    if _resolver is None:
+        _resolver = TimezoneResolver()
+    return _resolver
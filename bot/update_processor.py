@@ -0,0 +1,66 @@
+import asyncio
+import logging
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def chat_key(update: object):
+    """Ключ упорядочивания: чат, а если его нет (inline-запросы) — пользователь"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка апдейтов: разные чаты — одновременно,
+    апдейты одного чата — строго по очереди, в порядке поступления.
+
+    max_pending_updates ограничивает число принятых в работу апдейтов (включая ждущих своей очереди),
+    max_concurrent_handlers — сколько обработчиков реально выполняется одновременно.
+    Слот обработчика занимается только после блокировки чата, поэтому
+    один «болтливый» чат не забирает слоты у остальных.
+    """
+
+    def __init__(self, max_concurrent_handlers: int, max_pending_updates: int):
+        super().__init__(max(max_pending_updates, max_concurrent_handlers))
+        self.max_concurrent_handlers = max_concurrent_handlers
+        self._handlers = None
+        # chat_id -> [asyncio.Lock, сколько апдейтов чата в работе]
+        self._chats = {}
+
+    async def initialize(self) -> None:
+        self._handlers = asyncio.Semaphore(self.max_concurrent_handlers)
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = chat_key(update)
+        if key is None:
+            async with self._handlers:
+                await coroutine
+            return
+
+        # asyncio.Lock будит ожидающих в порядке очереди — апдейты чата не переставляются
+        chat = self._chats.setdefault(key, [asyncio.Lock(), 0])
+        chat[1] += 1
+        try:
+            async with chat[0]:
+                async with self._handlers:
+                    await coroutine
+        finally:
+            chat[1] -= 1
+            if chat[1] == 0:
+                del self._chats[key]
+
+    @property
+    def active_chats(self) -> int:
+        return len(self._chats)
@@ -1,56 +1,220 @@
 import json
 import os
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
 from typing import Dict, Optional
 
+from bot.db import connect
+
+logger = logging.getLogger(__name__)
+
+# поля, которые хранятся отдельными колонками; всё остальное — в extra (JSON)
+USER_FIELDS = ('email', 'timezone', 'reminder_minutes', 'calendar_id')
+
+
+class UserStorage(ABC):
+    """Хранилище данных пользователей"""
+
+    @abstractmethod
+    def get(self, user_id: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def put(self, user_id: str, user_data: Dict):
+        ...
+
+    @abstractmethod
+    def delete(self, user_id: str):
+        ...
+
+
+class JsonUserStorage(UserStorage):
+    """Все пользователи в одном JSON-файле (перезаписывается целиком, атомарно)"""
 
-class UserManager:
     def __init__(self, data_file: str = 'users_data.json'):
         self.data_file = data_file
         self.users_data = self._load_data()
+        # UserManager обращается к хранилищу из пула потоков
+        self._lock = threading.Lock()
 
     def _load_data(self) -> Dict:
         """Загрузка данных пользователей"""
         if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
         return {}
 
     def _save_data(self):
-        """Сохранение данных пользователей"""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
+        """Сохранение данных пользователей через временный файл"""
+        tmp_file = f"{self.data_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
             json.dump(self.users_data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.data_file)
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            user_data = self.users_data.get(user_id)
+            return dict(user_data) if user_data is not None else None
+
+    def put(self, user_id: str, user_data: Dict):
+        with self._lock:
+            self.users_data[user_id] = dict(user_data)
+            self._save_data()
+
+    def delete(self, user_id: str):
+        with self._lock:
+            if user_id in self.users_data:
+                del self.users_data[user_id]
+                self._save_data()
+
+
+class SqliteUserStorage(UserStorage):
+    """Пользователи в SQLite (WAL): каждое изменение — обновление одной строки в транзакции"""
+
+    def __init__(self, db_file: str = 'users.db'):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = connect(db_file)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id TEXT PRIMARY KEY,
+                    email TEXT,
+                    timezone TEXT,
+                    reminder_minutes INTEGER,
+                    calendar_id TEXT,
+                    extra TEXT NOT NULL DEFAULT '{}'
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS users_email ON users (email)")
 
-    def get_user(self, user_id: str) -> Optional[Dict]:
+    @staticmethod
+    def _row_values(user_id: str, user_data: Dict):
+        extra = {k: v for k, v in user_data.items() if k not in USER_FIELDS}
+        return (
+            user_id,
+            *(user_data.get(field) for field in USER_FIELDS),
+            json.dumps(extra, ensure_ascii=False),
+        )
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT email, timezone, reminder_minutes, calendar_id, extra FROM users WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        user_data = json.loads(row['extra'])
+        user_data.update({field: row[field] for field in USER_FIELDS})
+        return user_data
+
+    def put(self, user_id: str, user_data: Dict):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO users (user_id, email, timezone, reminder_minutes, calendar_id, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                self._row_values(user_id, user_data)
+            )
+
+    def delete(self, user_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+
+    def migrate_from_json(self, data_file: str):
+        """
+        Одноразовый перенос пользователей из JSON-файла.
+        После успешного переноса файл переименовывается в *.migrated.
+        Безопасен при одновременном запуске из нескольких процессов: проверка пустой таблицы
+        и вставка идут в одной транзакции BEGIN IMMEDIATE, переносит только первый процесс.
+        """
+        if not os.path.exists(data_file) or not self.is_empty():
+            return
+        try:
+            users_data = JsonUserStorage(data_file).users_data
+        except FileNotFoundError:
+            # файл уже перенёс и переименовал другой процесс
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Не удалось прочитать {data_file} для миграции: {e}")
+            return
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                empty = self._conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+                if empty:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO users (user_id, email, timezone, reminder_minutes, calendar_id, extra) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [self._row_values(user_id, user_data) for user_id, user_data in users_data.items()]
+                    )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        if not empty:
+            return
+        try:
+            os.replace(data_file, f"{data_file}.migrated")
+        except FileNotFoundError:
+            pass
+        logger.info(f"Перенесено {len(users_data)} пользователей из {data_file} в {self.db_file}")
+
+
+def create_storage(data_file: str = 'users_data.json') -> UserStorage:
+    """Хранилище по USER_STORAGE: sqlite (по умолчанию, с миграцией из JSON) или json"""
+    backend = os.getenv('USER_STORAGE', 'sqlite')
+    if backend == 'json':
+        return JsonUserStorage(data_file)
+    storage = SqliteUserStorage(os.getenv('USERS_DB', 'users.db'))
+    storage.migrate_from_json(data_file)
+    return storage
+
+
+class UserManager:
+    """
+    Асинхронный доступ к хранилищу пользователей для обработчиков бота.
+    SQLite ждёт блокировку до busy_timeout, пока в users.db пишут другие процессы бота,
+    поэтому обращения к хранилищу выполняются в потоке и не блокируют event loop.
+    """
+
+    def __init__(self, data_file: str = 'users_data.json', storage: UserStorage = None):
+        self.storage = storage or create_storage(data_file)
+
+    async def get_user(self, user_id: str) -> Optional[Dict]:
         """Получение данных пользователя"""
-        return self.users_data.get(user_id)
+        return await asyncio.to_thread(self.storage.get, user_id)
 
-    def save_user(self, user_id: str, user_data: Dict):
+    async def save_user(self, user_id: str, user_data: Dict):
         """Сохранение данных пользователя"""
         # гарантируем, что есть все нужные поля
         user_data.setdefault('email', None)
         user_data.setdefault('timezone', 'Europe/Moscow')
         user_data.setdefault('reminder_minutes', 10)
         user_data.setdefault('calendar_id', None)  # персональный календарь
-        self.users_data[user_id] = user_data
-        self._save_data()
+        await asyncio.to_thread(self.storage.put, user_id, user_data)
 
-    def delete_user(self, user_id: str):
+    async def delete_user(self, user_id: str):
         """Удаление пользователя"""
-        if user_id in self.users_data:
-            del self.users_data[user_id]
-            self._save_data()
+        await asyncio.to_thread(self.storage.delete, user_id)
 
-    def ensure_calendar_id(self, user_id: str, calendar_id: str):
+    async def ensure_calendar_id(self, user_id: str, calendar_id: str):
         """
         Сохраняет calendar_id пользователя, если он ещё не установлен.
         Используется после создания нового персонального календаря через сервисный аккаунт.
         """
-        user_data = self.get_user(user_id)
+        user_data = await self.get_user(user_id)
         if not user_data:
             user_data = {}
         if not user_data.get('calendar_id'):
             user_data['calendar_id'] = calendar_id
-            self.save_user(user_id, user_data)
+            await self.save_user(user_id, user_data)
@@ -0,0 +1,78 @@
+import os
+import logging
+import secrets
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, Response
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+
+def create_webhook_app(application: Application, webhook_url: str, secret_token: str = None,
+                       path: str = "/telegram") -> FastAPI:
+    """
+    FastAPI-приложение, принимающее апдейты Telegram по webhook.
+    Обработчик только кладёт апдейт в очередь Application и сразу отвечает 200 —
+    дальше апдейты разбирает update processor приложения.
+    :param webhook_url: публичный адрес сервера (без пути), например https://bot.example.com
+    :param secret_token: сверяется с заголовком X-Telegram-Bot-Api-Secret-Token
+    """
+    secret_token = secret_token or secrets.token_urlsafe(32)
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI):
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.bot.set_webhook(
+            url=f"{webhook_url.rstrip('/')}{path}",
+            secret_token=secret_token,
+            allowed_updates=Update.ALL_TYPES,
+            max_connections=100,
+        )
+        await application.start()
+        logger.info(f"Webhook установлен: {webhook_url.rstrip('/')}{path}")
+        try:
+            yield
+        finally:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+            await application.shutdown()
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.post(path)
+    async def telegram_webhook(request: Request):
+        if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret_token:
+            return Response(status_code=403)
+        update = Update.de_json(await request.json(), application.bot)
+        await application.update_queue.put(update)
+        return Response(status_code=200)
+
+    @app.get("/healthz")
+    async def healthz():
+        return {"update_queue": application.update_queue.qsize()}
+
+    return app
+
+
+def serve(application: Application):
+    """Запуск приложения в режиме BOT_MODE: polling (по умолчанию) или webhook через uvicorn"""
+    if os.getenv('BOT_MODE', 'polling') == 'webhook':
+        import uvicorn
+
+        webhook_url = os.getenv('WEBHOOK_URL')
+        if not webhook_url:
+            raise ValueError("WEBHOOK_URL не найден")
+        uvicorn.run(
+            create_webhook_app(application, webhook_url, os.getenv('WEBHOOK_SECRET')),
+            host=os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+            port=int(os.getenv('WEBHOOK_PORT', '8080')),
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
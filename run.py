@@ -10,6 +10,7 @@ sys.path.insert(0, str(Path(__file__).parent))
 load_dotenv()
 
 from bot.telegram_calendar_bot import TelegramCalendarBot
+from bot.sharding import ShardDispatcher
 
 
 def setup_logging():
@@ -49,6 +50,12 @@ def main():
         print("и поместите его в директорию с ботом")
 
     try:
+        shards = int(os.getenv('BOT_SHARDS', '1'))
+        if shards > 1:
+            # диспетчер + shards процессов-обработчиков, апдейты делятся по user_id
+            ShardDispatcher(token, shards).run()
+            return
+
         # Создание и запуск бота
         bot = TelegramCalendarBot()
         logger.info("✅ Бот успешно инициализирован")
@@ -0,0 +1,94 @@
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from server.compression import compress
+
+
+class CacheEntry:
+    """Готовый ответ: тело, ETag и время получения данных"""
+
+    __slots__ = ("body", "etag", "last_modified", "expires_at", "_encoded")
+
+    def __init__(self, body: bytes, ttl: float):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        # в HTTP-датах нет долей секунды
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.expires_at = time.monotonic() + ttl
+        self._encoded = {}
+
+    def encoded(self, encoding: str = None) -> bytes:
+        """Тело в нужной кодировке; сжимаем один раз на запись кэша, а не на каждый ответ"""
+        if encoding is None:
+            return self.body
+        body = self._encoded.get(encoding)
+        if body is None:
+            body = self._encoded[encoding] = compress(self.body, encoding)
+        return body
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "ETag": self.etag,
+            "Last-Modified": format_datetime(self.last_modified, usegmt=True),
+            "Cache-Control": "private, no-cache",
+            "Vary": "Accept-Encoding",
+        }
+
+    def not_modified(self, if_none_match: str = None, if_modified_since: str = None) -> bool:
+        """Можно ли ответить 304 на условный запрос браузера"""
+        if if_none_match:
+            return self.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+        if if_modified_since:
+            try:
+                return self.last_modified <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class ResponseCache:
+    """
+    TTL-кэш ответов с объединением запросов: параллельные запросы
+    с одинаковым ключом ждут один вызов к Google.
+    """
+
+    def __init__(self, ttl: float = 30, max_items: int = 1000):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._inflight = {}
+
+    async def get_or_load(self, key, loader) -> CacheEntry:
+        """await loader() возвращает тело ответа (bytes); исключения не кэшируются"""
+        # всё до await выполняется без переключения задач, поэтому блокировка не нужна
+        entry = self._items.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self._items.move_to_end(key)
+            return entry
+        task = self._inflight.get(key)
+        if task is None:
+            # загрузка — отдельная задача: отключившийся клиент не отменит её для остальных
+            task = asyncio.create_task(self._load(key, loader))
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, key, loader) -> CacheEntry:
+        try:
+            entry = CacheEntry(await loader(), self.ttl)
+        finally:
+            del self._inflight[key]
+
+        previous = self._items.get(key)
+        # данные не изменились — сохраняем прежний Last-Modified
+        if previous is not None and previous.etag == entry.etag:
+            entry.last_modified = previous.last_modified
+        self._items[key] = entry
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+        return entry
@@ -0,0 +1,34 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него отдаём gzip
+    brotli = None
+
+# предпочтение при равных q: brotli заметно лучше жмёт JSON
+_PREFERRED = ("br", "gzip") if brotli else ("gzip",)
+
+# меньше этого сжатие не окупает заголовки
+MIN_SIZE = 500
+
+
+def choose_encoding(accept_encoding: str, size: int):
+    """Кодировка ответа по Accept-Encoding браузера или None"""
+    if not accept_encoding or size < MIN_SIZE:
+        return None
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    for encoding in _PREFERRED:
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, mode=brotli.MODE_TEXT, quality=5)
+    return gzip.compress(body, compresslevel=6)
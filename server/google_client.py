@@ -0,0 +1,75 @@
+import os
+import asyncio
+import logging
+from urllib.parse import quote
+
+import httpx
+import httplib2
+import google_auth_httplib2
+from google.oauth2 import service_account
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_API = "https://www.googleapis.com/calendar/v3"
+
+
+class CalendarApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class AsyncCalendarClient:
+    """
+    Асинхронный клиент Calendar API поверх общего пула httpx: keep-alive соединения,
+    ограничение одновременных запросов к Google и таймауты. Токен сервисного аккаунта
+    обновляется одним запросом, даже если он истёк у многих запросов сразу.
+    """
+
+    def __init__(self, service_account_file: str, scopes, max_concurrency: int = None, timeout: float = None):
+        self.credentials = service_account.Credentials.from_service_account_file(service_account_file, scopes=scopes)
+        self.max_concurrency = max_concurrency or int(os.getenv("GOOGLE_MAX_CONCURRENCY", "10"))
+        self.timeout = timeout or float(os.getenv("GOOGLE_TIMEOUT", "10"))
+        self._http = httpx.AsyncClient(
+            base_url=CALENDAR_API,
+            timeout=httpx.Timeout(self.timeout, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._token_lock = asyncio.Lock()
+
+    def _refresh_token(self):
+        # синхронный транспорт google-auth; вызывается в отдельном потоке
+        self.credentials.refresh(google_auth_httplib2.Request(httplib2.Http(timeout=self.timeout)))
+
+    async def _token(self) -> str:
+        if not self.credentials.valid:
+            async with self._token_lock:
+                # пока ждали блокировку, токен мог обновить другой запрос
+                if not self.credentials.valid:
+                    await asyncio.to_thread(self._refresh_token)
+                    logger.info("Токен сервисного аккаунта обновлён")
+        return self.credentials.token
+
+    async def _get(self, path: str, params: dict) -> dict:
+        headers = {"Authorization": f"Bearer {await self._token()}", "Accept-Encoding": "gzip"}
+        async with self._semaphore:
+            response = await self._http.get(path, params=params, headers=headers)
+        if response.status_code != 200:
+            try:
+                message = response.json()["error"]["message"]
+            except (ValueError, KeyError, TypeError):
+                message = response.text[:200]
+            raise CalendarApiError(response.status_code, message)
+        return response.json()
+
+    async def list_events(self, calendar_id: str, **params) -> dict:
+        """Одна страница events.list; параметры — как в REST API (syncToken, pageToken, fields, ...)"""
+        params = {k: ("true" if v is True else v) for k, v in params.items() if v is not None}
+        return await self._get(f"/calendars/{quote(calendar_id, safe='')}/events", params)
+
+    async def close(self):
+        await self._http.aclose()
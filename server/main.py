@@ -1,16 +1,31 @@
 import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Query, Request
+from fastapi import FastAPI, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from fastapi.middleware.gzip import GZipMiddleware
 from datetime import datetime, timedelta
 import uvicorn
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
 
+from server.cache import CacheEntry, ResponseCache
+from server.compression import choose_encoding
+from server.google_client import AsyncCalendarClient
+from server.mirror import CalendarMirror
+from server.projection import project_events, view_timezone
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # закрываем пул соединений к Google
+    await calendar.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 static_path = os.path.join(os.path.dirname(__file__), "static")
@@ -29,15 +44,58 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# статика; ответы /api/calendar сжимаются заранее и middleware их пропускает
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 # Авторизация через сервисный аккаунт
 SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
 SERVICE_ACCOUNT_FILE = os.path.join(os.path.dirname(__file__), "../credentials.json")
 
 
-credentials = service_account.Credentials.from_service_account_file(
-    SERVICE_ACCOUNT_FILE, scopes=SCOPES
+# один асинхронный клиент на процесс: пул keep-alive соединений, лимит параллельных запросов и таймауты
+calendar = AsyncCalendarClient(SERVICE_ACCOUNT_FILE, SCOPES)
+
+# копия событий с инкрементальной синхронизацией по syncToken
+mirror = CalendarMirror(
+    calendar,
+    min_sync_interval=float(os.getenv("EVENT_MIRROR_SYNC_INTERVAL", "30")),
+    max_calendars=int(os.getenv("EVENT_MIRROR_MAX_CALENDARS", "500")),
 )
-calendar = build("calendar", "v3", credentials=credentials)
+
+# кэш ответов /api/calendar по (cid, time_min, time_max, limit, tz, mode)
+response_cache = ResponseCache(
+    ttl=float(os.getenv("CALENDAR_CACHE_TTL", "30")),
+    max_items=int(os.getenv("CALENDAR_CACHE_SIZE", "1000")),
+)
+
+# максимум периодов в /api/calendar/batch
+MAX_BATCH_WINDOWS = int(os.getenv("CALENDAR_BATCH_WINDOWS", "7"))
+
+
+async def fetch_events(cid: str, time_min: datetime, time_max: datetime, limit: int = None,
+                       tz: str = None, mode: str = "month") -> bytes:
+    """События периода из локальной копии календаря в компактном виде, сериализованные в ответ"""
+    items = await mirror.events_between(cid, time_min, time_max, limit=limit)
+    result = project_events(items, view_timezone(tz), with_days=mode == "month")
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+async def load_window(cid: str, time_min: datetime, time_max: datetime, limit: int = None,
+                      tz: str = None, mode: str = "month") -> CacheEntry:
+    """Ответ за период из кэша; одинаковые периоды одиночного и пакетного запросов кэшируются вместе"""
+    key = (cid, time_min.isoformat(), time_max.isoformat(), limit, tz, mode)
+    return await response_cache.get_or_load(key, lambda: fetch_events(cid, time_min, time_max, limit, tz, mode))
+
+
+def cached_response(request: Request, entry: CacheEntry) -> Response:
+    """304 на условный запрос, иначе тело в подходящей кодировке"""
+    if entry.not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=entry.headers)
+    headers = entry.headers
+    encoding = choose_encoding(request.headers.get("accept-encoding"), len(entry.body))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=entry.encoded(encoding), media_type="application/json", headers=headers)
 
 
 # в аргументах функции добавьте:
@@ -45,12 +103,15 @@ calendar = build("calendar", "v3", credentials=credentials)
 # end: str = Query(None, description="ISO end date, например 2025-10-05")
 
 @app.get("/api/calendar")
-def get_calendar(
+async def get_calendar(
+    request: Request,
     cid: str = Query(..., description="Calendar ID"),
+    tz: str = Query(None, description="таймзона пользователя (дни событий и события на весь день)"),
     mode: str = Query("month", description="day | week | month"),
     date: str = Query(None, description="ISO date (например 2025-09-03)"),
     start: str = Query(None, description="ISO start date override"),
-    end: str = Query(None, description="ISO end date override")
+    end: str = Query(None, description="ISO end date override"),
+    limit: int = Query(None, ge=1, description="максимум событий (первые по времени начала)")
 ):
     try:
         if start and end:
@@ -74,15 +135,43 @@ def get_calendar(
                     end_month = start_month.replace(month=start_month.month + 1, day=1)
                 time_min, time_max = start_month, end_month
 
-        events_result = calendar.events().list(
-            calendarId=cid,
-            timeMin=time_min.isoformat() + "Z",
-            timeMax=time_max.isoformat() + "Z",
-            singleEvents=True,
-            orderBy="startTime"
-        ).execute()
+        entry = await load_window(cid, time_min, time_max, limit, tz, mode)
+        return cached_response(request, entry)
+    except Exception as e:
+        return {"error": str(e)}
+
 
-        return {"events": events_result.get("items", [])}
+@app.get("/api/calendar/batch")
+async def get_calendar_batch(
+    request: Request,
+    cid: str = Query(..., description="Calendar ID"),
+    tz: str = Query(None, description="таймзона пользователя (дни событий и события на весь день)"),
+    mode: str = Query("month", description="day | week | month"),
+    windows: str = Query(..., description="периоды start/end через запятую, например 2025-09-01/2025-10-13,2025-10-01/2025-11-10"),
+):
+    """
+    Несколько периодов одним запросом — текущий и соседние, чтобы mini app
+    листала их без обращений к серверу. Ответ: {"windows": [{"start", "end", "events", "days"?}, ...]}
+    в порядке запроса.
+    """
+    try:
+        bounds = [part.split("/") for part in windows.split(",") if part]
+        if not bounds or len(bounds) > MAX_BATCH_WINDOWS:
+            raise ValueError(f"нужно от 1 до {MAX_BATCH_WINDOWS} периодов")
+        if any(len(bound) != 2 for bound in bounds):
+            raise ValueError("период задаётся как start/end")
+        periods = [(start, end, datetime.fromisoformat(start), datetime.fromisoformat(end)) for start, end in bounds]
+        entries = await asyncio.gather(*(
+            load_window(cid, time_min, time_max, tz=tz, mode=mode) for _, _, time_min, time_max in periods
+        ))
+        # тела окон уже сериализованы — склеиваем их, не разбирая JSON заново
+        parts = [
+            b'{"start":' + json.dumps(start).encode() + b',"end":' + json.dumps(end).encode() + b',' + entry.body[1:]
+            for (start, end, _, _), entry in zip(periods, entries)
+        ]
+        batch = CacheEntry(b'{"windows":[' + b",".join(parts) + b']}', ttl=0)
+        batch.last_modified = max(entry.last_modified for entry in entries)
+        return cached_response(request, batch)
     except Exception as e:
         return {"error": str(e)}
 
@@ -0,0 +1,154 @@
+import time
+import heapq
+import asyncio
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timezone
+from itertools import islice
+
+from server.google_client import CalendarApiError
+
+# только поля, которые показывает mini app
+SYNC_FIELDS = "nextPageToken,nextSyncToken,items(id,status,summary,description,location,start,end)"
+
+# события длиннее недели (отпуска, командировки) держим отдельно, чтобы не расширять окно поиска
+LONG_EVENT = 7 * 86400
+
+
+def _to_timestamp(value: dict) -> float:
+    """Начало/конец события в timestamp (события на весь день — по UTC, как и границы запроса)"""
+    if value.get("dateTime"):
+        return datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")).timestamp()
+    return datetime.fromisoformat(value["date"]).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _start(entry) -> float:
+    return entry[0]
+
+
+class _EventIndex:
+    """
+    События календаря по возрастанию начала: период выбирается бинарным поиском,
+    а не обходом всех событий. Событие, начавшееся раньше min_ts - max_duration,
+    закончилось до min_ts, поэтому левая граница поиска — min_ts - max_duration.
+    """
+
+    __slots__ = ("starts", "entries", "max_duration", "long_entries")
+
+    def __init__(self, events: dict):
+        entries = sorted(events.values(), key=_start)
+        self.entries = [entry for entry in entries if entry[1] - entry[0] <= LONG_EVENT]
+        self.long_entries = [entry for entry in entries if entry[1] - entry[0] > LONG_EVENT]
+        self.starts = [entry[0] for entry in self.entries]
+        self.max_duration = max((entry[1] - entry[0] for entry in self.entries), default=0)
+
+    def between(self, min_ts: float, max_ts: float, limit: int = None):
+        lo = bisect_left(self.starts, min_ts - self.max_duration)
+        hi = bisect_left(self.starts, max_ts)
+        matched = (entry for entry in islice(self.entries, lo, hi) if entry[1] > min_ts)
+        long_matched = [entry for entry in self.long_entries if entry[0] < max_ts and entry[1] > min_ts]
+        if long_matched:
+            matched = heapq.merge(long_matched, matched, key=_start)
+        return list(islice(matched, limit))
+
+
+class _CalendarState:
+    __slots__ = ("events", "index", "sync_token", "synced_at", "lock")
+
+    def __init__(self):
+        self.events = {}  # id -> (start_ts, end_ts, item)
+        self.index = None  # _EventIndex, строится при первом запросе после изменений
+        self.sync_token = None
+        self.synced_at = 0.0
+        self.lock = asyncio.Lock()
+
+
+class CalendarMirror:
+    """
+    Копия событий календарей в памяти: одна полная синхронизация,
+    дальше только изменения по syncToken (при 410 — снова полная).
+    """
+
+    def __init__(self, client, min_sync_interval: float = 30, max_calendars: int = 500):
+        self.client = client
+        self.min_sync_interval = min_sync_interval
+        self.max_calendars = max_calendars
+        # LRU: cid приходит из строки запроса, число календарей в памяти ограничено
+        self._calendars = OrderedDict()
+
+    def _state(self, cid: str) -> _CalendarState:
+        # все обращения идут из одного event loop, отдельная блокировка словарю не нужна
+        state = self._calendars.get(cid)
+        if state is None:
+            state = self._calendars[cid] = _CalendarState()
+            while len(self._calendars) > self.max_calendars:
+                self._calendars.popitem(last=False)
+        else:
+            self._calendars.move_to_end(cid)
+        return state
+
+    async def _pages(self, cid: str, sync_token: str = None):
+        """Страницы events.list по nextPageToken; последняя несёт nextSyncToken"""
+        params = {"singleEvents": True, "maxResults": 2500, "fields": SYNC_FIELDS, "syncToken": sync_token}
+        while True:
+            page = await self.client.list_events(cid, **params)
+            yield page
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return
+            params["pageToken"] = page_token
+
+    async def _fetch_into(self, events: dict, cid: str, sync_token: str = None):
+        """Применяет изменения к events постранично, не накапливая весь ответ; возвращает nextSyncToken"""
+        async for page in self._pages(cid, sync_token):
+            self._apply(events, page.get("items", []))
+        return page.get("nextSyncToken")
+
+    @staticmethod
+    def _apply(events: dict, items):
+        for item in items:
+            if item.get("status") == "cancelled":
+                events.pop(item["id"], None)
+            else:
+                events[item["id"]] = (_to_timestamp(item["start"]), _to_timestamp(item["end"]), item)
+
+    async def sync(self, cid: str) -> _CalendarState:
+        state = self._state(cid)
+        # параллельные запросы одного календаря ждут одну синхронизацию, а не запускают свои
+        async with state.lock:
+            if time.monotonic() - state.synced_at < self.min_sync_interval:
+                return state
+            try:
+                await self._sync_locked(state, cid)
+            except Exception:
+                # календарь недоступен или cid неверный — состояние не держим, следующий запрос начнёт заново
+                if self._calendars.get(cid) is state:
+                    del self._calendars[cid]
+                raise
+            state.index = None
+            state.synced_at = time.monotonic()
+        return state
+
+    async def _sync_locked(self, state: _CalendarState, cid: str):
+        if state.sync_token:
+            try:
+                # повторное применение тех же изменений безопасно, если страница оборвётся
+                state.sync_token = await self._fetch_into(state.events, cid, state.sync_token)
+                return
+            except CalendarApiError as e:
+                if e.status != 410:
+                    raise
+        events = {}
+        state.sync_token = await self._fetch_into(events, cid)
+        state.events = events
+
+    async def events_between(self, cid: str, time_min: datetime, time_max: datetime, limit: int = None):
+        """События календаря, пересекающиеся с периодом, по возрастанию начала (не больше limit)"""
+        state = await self.sync(cid)
+        min_ts = time_min.replace(tzinfo=time_min.tzinfo or timezone.utc).timestamp()
+        max_ts = time_max.replace(tzinfo=time_max.tzinfo or timezone.utc).timestamp()
+        # инкрементальная синхронизация меняет state.events на месте (_fetch_into), поэтому
+        # индекс строится и читается без await между ними — не добавляйте await сюда
+        if state.index is None:
+            state.index = _EventIndex(state.events)
+        return [entry[2] for entry in state.index.between(min_ts, max_ts, limit)]
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+
+def view_timezone(name: str):
+    """Таймзона mini app; неизвестная или пустая — UTC"""
+    try:
+        return ZoneInfo(name) if name else timezone.utc
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def _epoch_ms(value: dict, tz) -> int:
+    """Граница события в мс; дата события на весь день — полночь в таймзоне пользователя"""
+    if value.get("dateTime"):
+        return int(datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")).timestamp() * 1000)
+    return int(datetime.fromisoformat(value["date"]).replace(tzinfo=tz).timestamp() * 1000)
+
+
+def project_event(item: dict, tz) -> dict:
+    """
+    Только то, что показывают виды календаря:
+    {"title", "start", "end"} в мс, "all_day" — только у событий на весь день,
+    "description"/"location" — только если заполнены.
+    """
+    event = {
+        "title": item.get("summary") or "",
+        "start": _epoch_ms(item["start"], tz),
+        "end": _epoch_ms(item["end"], tz),
+    }
+    if not item["start"].get("dateTime"):
+        event["all_day"] = True
+    if item.get("description"):
+        event["description"] = item["description"]
+    if item.get("location"):
+        event["location"] = item["location"]
+    return event
+
+
+def project_events(items, tz, with_days: bool = False) -> dict:
+    """
+    Компактный ответ /api/calendar: события по возрастанию начала,
+    для месяца ещё и индексы событий по локальному дню начала ("days").
+    """
+    events = sorted((project_event(item, tz) for item in items), key=lambda e: e["start"])
+    result = {"events": events}
+    if with_days:
+        days = {}
+        for index, event in enumerate(events):
+            day = datetime.fromtimestamp(event["start"] / 1000, tz).date().isoformat()
+            days.setdefault(day, []).append(index)
+        result["days"] = days
+    return result
@@ -1,33 +1,22 @@
 // calendarView.js — month: dots, week/day: full visible events (auto-height)
 
-export function renderCalendar(events, mode, currentDate) {
+// events приходят с сервера уже отсортированными: {title, start, end (мс), all_day?, description?, location?}
+// days (только для month) — индексы событий по дню начала: {"YYYY-MM-DD": [0, 3]}
+export function renderCalendar(events, mode, currentDate, days = null) {
   const container = document.getElementById("calendar-container");
   container.innerHTML = "";
 
-  events = (events || []).slice().sort((a,b) => {
-    const da = parseEventDate(a, "start").getTime();
-    const db = parseEventDate(b, "start").getTime();
-    return da - db;
-  });
+  events = events || [];
 
   if (mode === "day") renderDay(events, container, currentDate);
   else if (mode === "week") renderWeek(events, container, currentDate);
-  else renderMonth(events, container, currentDate);
+  else renderMonth(events, container, currentDate, days);
 }
 
 /* ---------------- HELPERS ---------------- */
 
 function parseEventDate(ev, which = "start") {
-  const obj = ev?.[which];
-  if (!obj) return new Date(0);
-  if (obj.date) {
-    const [y, m, d] = obj.date.split("-").map(Number);
-    return new Date(y, m - 1, d);
-  } else if (obj.dateTime) {
-    return new Date(obj.dateTime);
-  } else {
-    return new Date(0);
-  }
+  return new Date(ev?.[which] ?? 0);
 }
 
 function minutesFromMidnightLocal(d) {
@@ -37,7 +26,7 @@ function clamp(v, a, b) { return Math.max(a, Math.min(b, v)); }
 
 /* ---------------- MONTH (dots / indicators) ---------------- */
 
-function renderMonth(events, container, currentDate) {
+function renderMonth(events, container, currentDate, days) {
   const grid = document.createElement("div");
   grid.className = "month-grid";
 
@@ -47,13 +36,17 @@ function renderMonth(events, container, currentDate) {
   const startIndex = (firstOfMonth.getDay() + 6) % 7; // monday-start
   const total = 42;
 
-  // events by local date (YYYY-MM-DD)
+  // events by local date (YYYY-MM-DD); сервер присылает готовые группы
   const eventsByDate = {};
-  for (const ev of events) {
-    const dt = parseEventDate(ev, "start");
-    const sd = dt.getFullYear() + '-' + String(dt.getMonth()+1).padStart(2,'0') + '-' + String(dt.getDate()).padStart(2,'0');
-    if (!eventsByDate[sd]) eventsByDate[sd] = [];
-    eventsByDate[sd].push(ev);
+  if (days) {
+    for (const [sd, indexes] of Object.entries(days)) eventsByDate[sd] = indexes.map(i => events[i]);
+  } else {
+    for (const ev of events) {
+      const dt = parseEventDate(ev, "start");
+      const sd = dt.getFullYear() + '-' + String(dt.getMonth()+1).padStart(2,'0') + '-' + String(dt.getDate()).padStart(2,'0');
+      if (!eventsByDate[sd]) eventsByDate[sd] = [];
+      eventsByDate[sd].push(ev);
+    }
   }
 
   const maxDots = 4;
@@ -92,8 +85,8 @@ function renderMonth(events, container, currentDate) {
         dot.title = buildTooltip(ev);
 
         // Добавляем data-атрибут для клика по событию
-        dot.dataset.title = ev.summary || "";
-        dot.dataset.time = ev.start?.dateTime ? parseEventDate(ev,"start").toLocaleTimeString([], {hour:'2-digit', minute:'2-digit'}) : "";
+        dot.dataset.title = ev.title || "";
+        dot.dataset.time = !ev.all_day ? parseEventDate(ev,"start").toLocaleTimeString([], {hour:'2-digit', minute:'2-digit'}) : "";
         dot.dataset.description = ev.description || "";
 
         dotsRow.appendChild(dot);
@@ -102,7 +95,7 @@ function renderMonth(events, container, currentDate) {
         const more = document.createElement("span");
         more.className = "month-more";
         more.textContent = `+${evs.length - maxDots}`;
-        more.title = evs.map(x => (x.summary || "")).join("\n");
+        more.title = evs.map(x => (x.title || "")).join("\n");
         more.style.color = "var(--muted)";
         more.style.fontSize = "12px";
         dotsRow.appendChild(more);
@@ -177,7 +170,7 @@ function renderWeek(events, container, currentDate) {
 
       const evEl = document.createElement("div");
       evEl.className = "event";
-      evEl.dataset.title = ev.summary || "Без названия";
+      evEl.dataset.title = ev.title || "Без названия";
       evEl.dataset.time = formatTimeRange(ev);
       evEl.dataset.description = ev.description || "";
       evEl.style.whiteSpace = "normal";
@@ -195,7 +188,7 @@ function renderWeek(events, container, currentDate) {
       evEl.style.borderRadius = "6px";
       evEl.style.boxShadow = "0 1px 0 rgba(16,24,40,0.03)";
 
-      evEl.innerHTML = `<div style="font-weight:600; margin-bottom:4px">${ev.summary || "Без названия"}</div>
+      evEl.innerHTML = `<div style="font-weight:600; margin-bottom:4px">${ev.title || "Без названия"}</div>
                         <div style="font-size:12px; opacity:.85">${s.toLocaleTimeString([], {hour:'2-digit', minute:'2-digit'})} – ${e.toLocaleTimeString([], {hour:'2-digit', minute:'2-digit'})}</div>`;
 
       slotContainer.appendChild(evEl);
@@ -270,7 +263,7 @@ function renderDay(events, container, currentDate) {
 
     const evEl = document.createElement("div");
     evEl.className = "event";
-    evEl.dataset.title = ev.summary || "Без названия";
+    evEl.dataset.title = ev.title || "Без названия";
     evEl.dataset.time = formatTimeRange(ev);
     evEl.dataset.description = ev.description || "";
 
@@ -289,7 +282,7 @@ function renderDay(events, container, currentDate) {
     evEl.style.borderRadius = "6px";
     evEl.style.boxShadow = "0 1px 0 rgba(16,24,40,0.03)";
 
-    evEl.innerHTML = `<div class="title" style="font-weight:600">${ev.summary || "Без названия"}</div>
+    evEl.innerHTML = `<div class="title" style="font-weight:600">${ev.title || "Без названия"}</div>
                       <div class="time" style="font-size:12px; opacity:.85">${s.toLocaleTimeString([], {hour:'2-digit', minute:'2-digit'})} – ${e.toLocaleTimeString([], {hour:'2-digit', minute:'2-digit'})}</div>`;
 
     eventsCol.appendChild(evEl);
@@ -309,8 +302,8 @@ function renderDay(events, container, currentDate) {
 function buildTooltip(ev) {
   const s = parseEventDate(ev, "start");
   const e = parseEventDate(ev, "end") || null;
-  const time = ev.start?.dateTime ? s.toLocaleTimeString([], {hour:'2-digit', minute:'2-digit'}) : "";
-  return `${time} ${ev.summary || ""}`.trim();
+  const time = !ev.all_day ? s.toLocaleTimeString([], {hour:'2-digit', minute:'2-digit'}) : "";
+  return `${time} ${ev.title || ""}`.trim();
 }
 
 function formatMaybeLocationOrDesc(ev) {
@@ -11,8 +11,8 @@ export async function renderCalendar(containerEl, { calendarId, mode, date }) {
     // Рендерим список событий в том же блоке
     if (data.events && data.events.length) {
       const html = data.events.map(ev => {
-        const start = new Date(ev.start.dateTime || ev.start.date);
-        const end = new Date(ev.end?.dateTime || ev.end?.date || start);
+        const start = new Date(ev.start);
+        const end = new Date(ev.end ?? ev.start);
 
         return `
           <div class="event">
@@ -23,7 +23,7 @@ export async function renderCalendar(containerEl, { calendarId, mode, date }) {
               ${end.toLocaleTimeString('ru-RU', { hour:'2-digit', minute:'2-digit' })}
             </div>
             <div class="event-title">
-              ${ev.summary || '(без названия)'}
+              ${ev.title || '(без названия)'}
             </div>
           </div>
         `;
@@ -1,5 +1,6 @@
 import { renderCalendar } from "./calendarView.js";
 import "./calendarInteraction.js";
+import { RangeCache } from "./rangeCache.js";
 
 
 const urlParams = new URLSearchParams(window.location.search);
@@ -9,49 +10,108 @@ const timezone = urlParams.get("tz") || Intl.DateTimeFormat().resolvedOptions().
 let mode = "month";
 let currentDate = new Date();
 let events = [];
+let days = null;
 
 const loaderEl = document.getElementById("loader");
 const calendarContainer = document.getElementById("calendar-container");
 
 // Функция рендеринга + обновление периода
 function render() {
-  renderCalendar(events, mode, currentDate);
+  renderCalendar(events, mode, currentDate, days);
   updateCurrentPeriod();
 }
 
-// Загрузка событий с API
-async function loadEvents() {
-  loaderEl.style.display = "block";
-  try {
-    // для month — отправляем диапазон видимой сетки (6 недель)
-    let query = `cid=${encodeURIComponent(calendarId)}&tz=${encodeURIComponent(timezone)}&mode=${mode}`;
-    if (mode === "month") {
-      // вычисляем старт первой видимой клетки (понедельник первой недели отображения)
-      const year = currentDate.getFullYear();
-      const month = currentDate.getMonth();
-      const firstOfMonth = new Date(year, month, 1);
-      const startOffset = (firstOfMonth.getDay() + 6) % 7; // 0..6, 0=Mon
-      const firstVisible = new Date(year, month, 1 - startOffset);
-      const lastVisible = new Date(firstVisible);
-      lastVisible.setDate(firstVisible.getDate() + 41); // 6*7 -1
-      query += `&start=${firstVisible.toISOString().slice(0,10)}&end=${new Date(lastVisible.getFullYear(), lastVisible.getMonth(), lastVisible.getDate()+1).toISOString().slice(0,10)}`; // end exclusive
-    } else {
-      // для week/day — отправляем date (бэку по-прежнему удобней)
-      const dateStr = currentDate.toISOString().slice(0, 10);
-      query += `&date=${dateStr}`;
+// Максимум периодов в одном /api/calendar/batch (CALENDAR_BATCH_WINDOWS на сервере)
+const MAX_BATCH_WINDOWS = 7;
+// Сколько соседних периодов догружать заранее (?ahead=2&behind=1), не больше 3 в каждую сторону
+function prefetchCount(name, fallback) {
+  const value = Number.parseInt(urlParams.get(name) ?? "", 10);
+  return Number.isFinite(value) ? Math.min(Math.max(value, 0), 3) : fallback;
+}
+const PREFETCH_AHEAD = prefetchCount("ahead", 2);
+const PREFETCH_BEHIND = prefetchCount("behind", 1);
+
+const rangeCache = new RangeCache(fetchWindows);
+let loadSeq = 0;
+
+// локальная дата YYYY-MM-DD
+function ymd(d) {
+  return d.getFullYear() + '-' + String(d.getMonth()+1).padStart(2,'0') + '-' + String(d.getDate()).padStart(2,'0');
+}
+
+// Видимый период режима: month — сетка из 6 недель, week — с понедельника, day — сутки (end не включается)
+function periodWindow(viewMode, date) {
+  let first, days;
+  if (viewMode === "month") {
+    const firstOfMonth = new Date(date.getFullYear(), date.getMonth(), 1);
+    const startOffset = (firstOfMonth.getDay() + 6) % 7; // 0..6, 0=Mon
+    first = new Date(date.getFullYear(), date.getMonth(), 1 - startOffset);
+    days = 42;
+  } else if (viewMode === "week") {
+    first = new Date(date.getFullYear(), date.getMonth(), date.getDate() - (date.getDay() + 6) % 7);
+    days = 7;
+  } else {
+    first = new Date(date.getFullYear(), date.getMonth(), date.getDate());
+    days = 1;
+  }
+  const end = new Date(first.getFullYear(), first.getMonth(), first.getDate() + days);
+  return { start: ymd(first), end: ymd(end) };
+}
+
+// Дата периода, сдвинутого на step назад/вперёд
+function shiftDate(viewMode, date, step) {
+  if (viewMode === "month") return new Date(date.getFullYear(), date.getMonth() + step, 1);
+  const days = viewMode === "week" ? 7 * step : step;
+  return new Date(date.getFullYear(), date.getMonth(), date.getDate() + days);
+}
+
+function neighbourWindows(viewMode, date) {
+  const windows = [];
+  for (let i = 1; i <= PREFETCH_AHEAD; i++) windows.push(periodWindow(viewMode, shiftDate(viewMode, date, i)));
+  for (let i = 1; i <= PREFETCH_BEHIND; i++) windows.push(periodWindow(viewMode, shiftDate(viewMode, date, -i)));
+  return windows;
+}
+
+// Несколько периодов одним запросом; больше MAX_BATCH_WINDOWS — несколькими параллельными
+async function fetchWindows(viewMode, windows) {
+  if (windows.length > MAX_BATCH_WINDOWS) {
+    const chunks = [];
+    for (let i = 0; i < windows.length; i += MAX_BATCH_WINDOWS) {
+      chunks.push(fetchWindows(viewMode, windows.slice(i, i + MAX_BATCH_WINDOWS)));
     }
+    return (await Promise.all(chunks)).flat();
+  }
+  const query = `cid=${encodeURIComponent(calendarId)}&tz=${encodeURIComponent(timezone)}&mode=${viewMode}`
+    + `&windows=${windows.map(w => `${w.start}/${w.end}`).join(",")}`;
+  const res = await fetch(`/api/calendar/batch?${query}`);
+  if (!res.ok) throw new Error("Ошибка сервера");
+  const data = await res.json();
+  if (data.error) throw new Error(data.error);
+  return data.windows;
+}
+
+// Загрузка событий: из кэша периодов без лоадера, иначе с сервера вместе с соседними периодами
+async function loadEvents() {
+  const seq = ++loadSeq;
+  const viewMode = mode;
+  const win = periodWindow(viewMode, currentDate);
+  const neighbours = neighbourWindows(viewMode, currentDate);
+  const cached = rangeCache.peek(viewMode, win);
 
-    const res = await fetch(`/api/calendar?${query}`);
-    if (!res.ok) throw new Error("Ошибка сервера");
-    const data = await res.json();
-    if (data.error) throw new Error(data.error);
+  if (!cached) loaderEl.style.display = "block";
+  try {
+    const data = cached || await rangeCache.get(viewMode, win, neighbours);
+    if (seq !== loadSeq) return; // пока ждали, пользователь ушёл на другой период
     events = data.events || [];
+    days = data.days || null;
     render(); // render() вызывает renderCalendar + updateCurrentPeriod
+    rangeCache.prefetch(viewMode, neighbours);
   } catch (err) {
+    if (seq !== loadSeq) return;
     console.error("Ошибка загрузки:", err);
     calendarContainer.innerHTML = `<div class="error">Ошибка: ${err.message}</div>`;
   } finally {
-    loaderEl.style.display = "none";
+    if (seq === loadSeq) loaderEl.style.display = "none";
   }
 }
 
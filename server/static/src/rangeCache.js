@@ -0,0 +1,72 @@
+// src/rangeCache.js
+// Кэш загруженных периодов: переход на соседнюю неделю/месяц отрисовывается без запроса,
+// недостающие периоды догружаются одним пакетным запросом.
+
+export class RangeCache {
+  // fetchWindows(mode, windows) -> Promise<[{events, days?}, ...]> в порядке windows
+  constructor(fetchWindows, { ttlMs = 60000, maxEntries = 60 } = {}) {
+    this.fetchWindows = fetchWindows;
+    this.ttlMs = ttlMs;
+    this.maxEntries = maxEntries;
+    this.entries = new Map();   // key -> { data, expiresAt }
+    this.inflight = new Map();  // key -> Promise<data>
+  }
+
+  static key(mode, win) {
+    return `${mode}|${win.start}|${win.end}`;
+  }
+
+  // данные периода, если они есть и не устарели
+  peek(mode, win) {
+    const key = RangeCache.key(mode, win);
+    const entry = this.entries.get(key);
+    if (!entry) return null;
+    if (entry.expiresAt < Date.now()) {
+      this.entries.delete(key);
+      return null;
+    }
+    return entry.data;
+  }
+
+  // Promise с данными периода win; extra (соседние периоды) догружаются тем же запросом
+  get(mode, win, extra = []) {
+    const missing = [win, ...extra].filter(w =>
+      !this.peek(mode, w) && !this.inflight.has(RangeCache.key(mode, w)));
+    if (missing.length) this.load(mode, missing);
+
+    const cached = this.peek(mode, win);
+    return cached ? Promise.resolve(cached) : this.inflight.get(RangeCache.key(mode, win));
+  }
+
+  // фоновая догрузка: ошибки не показываем, период загрузится при переходе на него
+  prefetch(mode, windows) {
+    const missing = windows.filter(w =>
+      !this.peek(mode, w) && !this.inflight.has(RangeCache.key(mode, w)));
+    if (missing.length) this.load(mode, missing);
+  }
+
+  load(mode, windows) {
+    const request = this.fetchWindows(mode, windows);
+    windows.forEach((w, i) => {
+      const key = RangeCache.key(mode, w);
+      const promise = request.then(results => {
+        this.store(key, results[i]);
+        return results[i];
+      });
+      this.inflight.set(key, promise);
+      // ошибку получит тот, кто ждёт этот период; здесь только убираем его из загрузки
+      promise.catch(() => {}).then(() => {
+        if (this.inflight.get(key) === promise) this.inflight.delete(key);
+      });
+    });
+  }
+
+  store(key, data) {
+    this.entries.delete(key);
+    this.entries.set(key, { data, expiresAt: Date.now() + this.ttlMs });
+    // Map хранит порядок вставки — вытесняем самые старые
+    while (this.entries.size > this.maxEntries) {
+      this.entries.delete(this.entries.keys().next().value);
+    }
+  }
+}